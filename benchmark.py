@@ -0,0 +1,287 @@
+#--------------------------------------------------------------------------------
+#   Scenario benchmark of Munqy, based on the worlds of main.py
+#   (c) Pierre Denis 2021-2025
+#--------------------------------------------------------------------------------
+""" usage: python benchmark.py [worlds...] [--frames N] [--warmup N] [--no-render]
+                               [--scene-index {bsp,none,hybrid}] [--index-profile]
+                               [--output FILE] [--baseline FILE]
+
+    each world of main.py is built in a separate process, in an offscreen window; a scripted sequence of
+    thrusts, shots, bombs and item drops is then played, frame by frame, as fast as possible; the world H is
+    the level of world 8 in a headless MQSpace (no QApplication), where circles, polygons, texts and pixmaps
+    are dropped;
+    the results (steps per second, time per phase, item counts, peak memory) are written in a JSON file,
+    which can be given as baseline of a later run to compare the engine's performances
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+import random
+import tempfile
+from time import perf_counter
+try:
+    import resource
+except ImportError:
+    resource = None
+
+HEADLESS_WORLD = "H"
+WORLDS = ("0", "1", "2", "3", "4", "5", "6", "7", "8", "9", "P3", HEADLESS_WORLD)
+NB_FRAMES = 1000
+NB_WARMUP_FRAMES = 50
+OUTPUT_FILENAME = "benchmark_results.json"
+# relative slowdown, compared to baseline, above which a result is flagged
+REGRESSION_THRESHOLD = 0.10
+RANDOM_SEED = 2021
+
+
+def peak_memory_mb():
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+    return max_rss / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def play_script(uspace, frame_idx):
+    """ applies the scripted inputs of the given frame: thrust cycle, continuous fire, bombs and item drops
+    """
+    player_item = uspace.player_item
+    if player_item is not None and player_item.is_alive:
+        phase = frame_idx % 200
+        if phase < 60:
+            player_item.thrust_up()
+        elif phase < 100:
+            player_item.thrust_left()
+        elif phase < 140:
+            player_item.thrust_right()
+        elif phase < 160:
+            player_item.thrust_down()
+        player_item.fire()
+        player_item.drop_bomb()
+    if frame_idx % 5 == 0:
+        uspace.drop_item1()
+    if frame_idx % 20 == 0:
+        uspace.drop_item2()
+    if frame_idx % 100 == 0:
+        uspace.drop_item3()
+    if frame_idx % 100 == 50:
+        uspace.drop_item4()
+
+
+def run_world(world_arg, nb_frames, nb_warmup_frames, with_render, scene_index=None, with_index_profile=False):
+    """ builds the given world of main.py and plays the scripted scenario on it; returns the measures as a dict
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    random.seed(RANDOM_SEED)
+    import munqy
+    munqy.SOUND_ENABLED = False
+    if scene_index is not None:
+        munqy.SCENE_INDEX = scene_index
+    munqy.SCENE_INDEX_PROFILE = with_index_profile
+    import main
+
+    class BenchmarkSpace(main.USpace):
+        """ USpace dropping items around the player
+        """
+
+        def get_cursor_position(self):
+            if self.player_item is None:
+                return (0.0, 0.0)
+            (x, y) = self.player_item.position
+            return (x + random.uniform(-200.0, 200.0), y + random.uniform(-300.0, -100.0))
+
+    start_time = perf_counter()
+    uspace = BenchmarkSpace(world_arg)
+    uspace.show()
+    application = munqy.get_application()
+    # lets the window take its full screen size before the first paint
+    application.processEvents()
+    if not with_render:
+        uspace.main_view.setUpdatesEnabled(False)
+    setup_duration = perf_counter() - start_time
+    nb_steps_per_frame = max(1, round(uspace.timer_elapse / uspace.dt_s))
+    max_counts = {"bodies": 0, "shapes": 0, "graphics_items": 0, "particles": 0}
+    for frame_idx in range(nb_warmup_frames + nb_frames):
+        if frame_idx == nb_warmup_frames:
+            uspace.profiler.reset()
+            start_total_culled_updates = uspace.total_culled_updates
+            start_time = perf_counter()
+        play_script(uspace, frame_idx)
+        uspace.step_n(nb_steps_per_frame)
+        # paints the view, as updated by the frame; the paint time is counted by the profiler in the next frame
+        application.processEvents()
+        if frame_idx % 10 == 0:
+            counts = {"bodies": len(uspace.bodies),
+                      "shapes": len(uspace.shapes),
+                      "graphics_items": len(uspace.items()),
+                      "particles": sum(particle_system.count for particle_system in uspace.particle_systems)}
+            for (name, count) in counts.items():
+                max_counts[name] = max(max_counts[name], count)
+    duration = perf_counter() - start_time
+    nb_steps = nb_frames * nb_steps_per_frame
+    profiler = uspace.profiler
+    phase_ms_per_frame = {phase: 1e3 * phase_duration / profiler.nb_frames
+                          for (phase, phase_duration) in zip(munqy.FrameProfiler.PHASES, profiler.totals)}
+    frame_percentiles_ms = {f"p{percent}": 1e3 * duration
+                            for (percent, duration) in zip((50, 95, 99), profiler.percentiles()["frame"])}
+    return {"world": world_arg,
+            "setup_s": setup_duration,
+            "frames": nb_frames,
+            "steps": nb_steps,
+            "steps_per_s": nb_steps / duration,
+            "frame_ms": 1e3 * duration / nb_frames,
+            "phase_ms_per_frame": phase_ms_per_frame,
+            "frame_percentiles_ms": frame_percentiles_ms,
+            "overruns": profiler.nb_overruns,
+            "culled_updates_per_frame": (uspace.total_culled_updates - start_total_culled_updates) / nb_frames,
+            "max_counts": max_counts,
+            "pools": uspace.pool_statistics(),
+            "peak_memory_mb": peak_memory_mb()}
+
+
+def run_headless_world(nb_frames, nb_warmup_frames, nb_steps_per_frame=2):
+    """ loads the level of world 8 in a headless MQSpace and drops items of every kind on it, including texts and
+        pixmaps, which have no graphics item in this mode; returns the measures as a dict, like run_world
+    """
+    random.seed(RANDOM_SEED)
+    import munqy
+    from PyQt5.QtGui import QImage, QColor
+    # the pixmap is written with QImage, which does not require a QGuiApplication, unlike QPixmap
+    pixmap_filename = os.path.join(tempfile.mkdtemp(), "pixmap.png")
+    image = QImage(40, 20, QImage.Format_ARGB32)
+    image.fill(QColor(200, 120, 40))
+    image.save(pixmap_filename)
+    start_time = perf_counter()
+    space = munqy.MQSpace(headless=True)
+    space.gravity = (0, 600.0)
+    (x0, y0) = space.load_level("resources/level.svg")
+    setup_duration = perf_counter() - start_time
+    max_counts = {"bodies": 0, "shapes": 0, "graphics_items": 0, "particles": 0}
+    for frame_idx in range(nb_warmup_frames + nb_frames):
+        if frame_idx == nb_warmup_frames:
+            space.profiler.reset()
+            start_time = perf_counter()
+        if frame_idx % 5 == 0:
+            position = (x0 + random.uniform(-200.0, 200.0), y0 - random.uniform(100.0, 300.0))
+            kind = frame_idx // 5 % 4
+            if kind == 0:
+                item = space.add_circle_item(position, 0.0, random.uniform(5.0, 20.0), density=1.0)
+            elif kind == 1:
+                item = space.add_polygon_item(position, 0.0, ((0, 0), (40, 0), (20, 30)), density=1.0)
+            elif kind == 2:
+                item = space.add_text_item(position, 0.0, "Munqy", font_size=20, density=1.0)
+            else:
+                item = space.add_pixmap_item(position, 0.0, pixmap_filename, rounded=frame_idx % 2 == 0,
+                                             density=1.0)
+            item.set_transient(5.0, with_fading=True)
+        space.step_n(nb_steps_per_frame)
+        if frame_idx % 10 == 0:
+            max_counts["bodies"] = max(max_counts["bodies"], len(space.bodies))
+            max_counts["shapes"] = max(max_counts["shapes"], len(space.shapes))
+    duration = perf_counter() - start_time
+    nb_steps = nb_frames * nb_steps_per_frame
+    profiler = space.profiler
+    phase_ms_per_frame = {phase: 1e3 * phase_duration / profiler.nb_frames
+                          for (phase, phase_duration) in zip(munqy.FrameProfiler.PHASES, profiler.totals)}
+    frame_percentiles_ms = {f"p{percent}": 1e3 * duration
+                            for (percent, duration) in zip((50, 95, 99), profiler.percentiles()["frame"])}
+    return {"world": HEADLESS_WORLD,
+            "setup_s": setup_duration,
+            "frames": nb_frames,
+            "steps": nb_steps,
+            "steps_per_s": nb_steps / duration,
+            "frame_ms": 1e3 * duration / nb_frames,
+            "phase_ms_per_frame": phase_ms_per_frame,
+            "frame_percentiles_ms": frame_percentiles_ms,
+            "overruns": profiler.nb_overruns,
+            "culled_updates_per_frame": 0.0,
+            "max_counts": max_counts,
+            "pools": space.pool_statistics(),
+            "peak_memory_mb": peak_memory_mb()}
+
+
+def run_world_in_subprocess(world_arg, args):
+    """ runs the given world in a fresh Python process, so that module globals and peak memory are not shared
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--child", world_arg,
+               "--frames", str(args.frames), "--warmup", str(args.warmup)]
+    if args.no_render:
+        command.append("--no-render")
+    if args.scene_index is not None:
+        command.extend(("--scene-index", args.scene_index))
+    if args.index_profile:
+        command.append("--index-profile")
+    completed_process = subprocess.run(command, capture_output=True, text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)))
+    lines = completed_process.stdout.strip().splitlines()
+    if completed_process.returncode != 0 or not lines:
+        error_lines = completed_process.stderr.strip().splitlines()
+        return {"world": world_arg, "error": error_lines[-1] if error_lines else "no result"}
+    return json.loads(lines[-1])
+
+
+def print_results(results, baseline_results):
+    baseline_by_world = {result["world"]: result for result in baseline_results}
+    print(f"{'world':>6} {'steps/s':>9} {'frame ms':>9} {'physics':>8} {'sync':>8} {'paint':>8}"
+          f" {'bodies':>7} {'shapes':>7} {'MB':>6}  vs baseline")
+    for result in results:
+        if "error" in result:
+            print(f"{result['world']:>6} ERROR: {result['error']}")
+            continue
+        phase_ms = result["phase_ms_per_frame"]
+        peak_memory = result["peak_memory_mb"]
+        comparison = ""
+        baseline_result = baseline_by_world.get(result["world"])
+        if baseline_result is not None and "error" not in baseline_result:
+            ratio = result["steps_per_s"] / baseline_result["steps_per_s"]
+            comparison = f"{ratio:6.2f}x"
+            if ratio < 1.0 - REGRESSION_THRESHOLD:
+                comparison += "  REGRESSION"
+        print(f"{result['world']:>6} {result['steps_per_s']:9.0f} {result['frame_ms']:9.2f}"
+              f" {phase_ms['physics']:8.2f} {phase_ms['sync']:8.2f} {phase_ms['paint']:8.2f}"
+              f" {result['max_counts']['bodies']:7d} {result['max_counts']['shapes']:7d}"
+              f" {peak_memory if peak_memory is not None else float('nan'):6.0f}  {comparison}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="scenario benchmark of Munqy, based on the worlds of main.py")
+    parser.add_argument("worlds", nargs="*", default=WORLDS, help="worlds to run (default: all)")
+    parser.add_argument("--frames", type=int, default=NB_FRAMES, help="number of measured frames")
+    parser.add_argument("--warmup", type=int, default=NB_WARMUP_FRAMES, help="number of frames before measure")
+    parser.add_argument("--no-render", action="store_true", help="do not paint the view")
+    parser.add_argument("--scene-index", choices=("bsp", "none", "hybrid"), help="index of the scene's items")
+    parser.add_argument("--index-profile", action="store_true",
+                        help="measure the scene index maintenance and item lookup (index and lookup phases)")
+    parser.add_argument("--output", default=OUTPUT_FILENAME, help="JSON file receiving the results")
+    parser.add_argument("--baseline", help="JSON file of a previous run, to compare with")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child is not None:
+        # the result is printed as last line of stdout, for the parent process
+        if args.child == HEADLESS_WORLD:
+            print(json.dumps(run_headless_world(args.frames, args.warmup)))
+            return
+        result = run_world(args.child, args.frames, args.warmup, not args.no_render, args.scene_index,
+                           args.index_profile)
+        print(json.dumps(result))
+        return
+    baseline_results = []
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline_results = json.load(f)["results"]
+    results = []
+    for world_arg in args.worlds:
+        print(f"running world {world_arg}...", file=sys.stderr)
+        results.append(run_world_in_subprocess(world_arg, args))
+    with open(args.output, "w") as f:
+        json.dump({"frames": args.frames, "warmup": args.warmup, "render": not args.no_render,
+                   "scene_index": args.scene_index,
+                   "python": sys.version.split()[0], "results": results}, f, indent=2)
+    print_results(results, baseline_results)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,8 @@ BOX_HSIZE = 400
 BOX_VSIZE = 800
 BOMB_REARM_DELAY_S = 0.5
 BOMB_EXPLOSION_DELAY_S = 4.0
+BOMB_BLAST_RADIUS = 300
+BOMB_BLAST_IMPULSE = 5e16
 BULLET_REARM_DELAY_S = 0.2
 BULLET_LIFETIME_S = 2.0
 BULLET_SPEED = 12e2
@@ -37,6 +39,7 @@ from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QRadialGradient, QBrush, QPen, QColor, QCursor
 from munqy import Sound
 import munqy
+import pymunk
 import sys
 from math import pi, cos, sin, atan2, hypot
 from random import uniform
@@ -49,7 +52,12 @@ space = None
 
 class USpace(munqy.MQSpace):
 
-    def __init__(self):
+    def __init__(self, world_arg=None):
+        global uspace
+        uspace = self
+        if world_arg is None and len(sys.argv) >= 2:
+            world_arg = sys.argv[1]
+        self.world_arg = world_arg
         self.brush2 = QBrush(QColor(120,120,250))
         self.color3 = Qt.green #QColor(180,220,180)
         self.brush3 = QBrush(self.color3)
@@ -64,6 +72,15 @@ class USpace(munqy.MQSpace):
         self.label.setStyleSheet("QLabel { font-size: 80px; color : white; }")
         # self.label.setText(256*"X")
         self.label.hide()
+        self.exhaust_particles = self.add_particle_system(
+            munqy.ParticleSystem(capacity=2000, radius=0.75, color=AbstractSpacecraftItem.wind_brush.color(),
+                                 with_fading=True, collides=True, elasticity=0.0))
+        self.debris_particles = self.add_particle_system(
+            munqy.ParticleSystem(capacity=2000, radius=0.75, color=Bomb.brush.color(),
+                                 with_fading=False, collides=True, elasticity=0.65))
+        self.set_pool_size(Bullet, 64)
+        self.set_pool_size(FireFlash, 32)
+        self.set_pool_size(BombFlash, 8)
         Sound.say("3, 2, 1, GO!")
 
     def do_initial_setup(self):
@@ -74,17 +91,17 @@ class USpace(munqy.MQSpace):
         self.brush2 = QBrush(radialGrad)
         """
         spacecraft_position = (0, -400)
-        if len(sys.argv) >= 2:
-            world_arg = sys.argv[1]
+        world_arg = self.world_arg
+        if world_arg is not None:
             if world_arg == "0":
                 r = 400
                 x = self.add_polygon_item(self.get_cursor_position(), 0., vertices=((0, 0), (r, 0), (r, r),
                                                                                 (r//2, r), (r//2, r//2), (0, r//2)),
                                       velocity=(0, 0), density=1.25e11, brush=self.brush3)
-                x._set_position((0, -650))
+                x.position = (0, -650)
                 x = self.add_polygon_item(self.get_cursor_position(), 0., vertices=((0, 0), (r, 0), (r, r)),
                                       velocity=(0, 0), density=1.25e11, brush=self.brush3)
-                x._set_position((0, -150))
+                x.position = (0, -150)
             elif world_arg == "1":
                 self.gravity = (0,GRAVITY)
                 self.damping = DAMPING
@@ -195,9 +212,10 @@ class USpace(munqy.MQSpace):
             elif world_arg == "6":
                 with open("resources/siriusbee_levels.txt", 'r') as f:
                     matrix = f.readlines()
-                central_item = munqy.CompoundItem.build_from_matrix((-500,-500),0,matrix,"W",block_size=20,
-                                                                    brush=QBrush(Qt.darkGray),elasticity=1.,soft=False,
-                                                                    body_type=munqy.KINEMATIC,angular_velocity=20.00)
+                # the level is streamed by chunks, around the spacecraft and the view
+                central_item = munqy.ChunkedMatrixItem((-500,-500),0,matrix,"W",block_size=20,
+                                                       brush=QBrush(Qt.darkGray),elasticity=1.,soft=False,
+                                                       body_type=munqy.KINEMATIC,angular_velocity=20.00)
                 # self.add_item(munqy.CompoundItem.build_from_matrix((-500,-500),0,matrix,"w",block_size=20,
                 #                                                     brush=QBrush(Qt.darkGray),elasticity=1.,soft=False,
                 #                                                     body_type=munqy.KINEMATIC,angular_velocity=0.00))
@@ -265,12 +283,13 @@ class USpace(munqy.MQSpace):
         #self.collision_handler1 = self.add_wildcard_collision_handler(id(Bullet))
         ## self.collision_handler1 = self.add_collision_handler(id(Bullet),id(munqy.CircleItem))
         #self.collision_handler1.post_solve = self.collides
-        self.on_collision(id(Bullet), None, begin=self.collides)
+        self.on_collision_event(self.collision_type(Bullet), None, self.collides)
 
         # self.kinematic_items = []
         actions_by_single_key = {
             (Qt.NoModifier, Qt.Key_Escape)       : (self.close, (),                                   "quit"                                               ),
             (Qt.NoModifier, Qt.Key_H)            : (self.toggle_help, (),                             "toggle help"                                        ),
+            (Qt.NoModifier, Qt.Key_P)            : (self.toggle_performance_hud, (),                  "toggle performance HUD"                             ),
             (Qt.ShiftModifier, Qt.Key_X)         : (self.center_view_on_player, (False, True),        "toggle view centering on spacecraft"                ),
             (Qt.ShiftModifier, Qt.Key_W)         : (self.center_view_on_central_item, (True, True),   "toggle view centering on central item with rotation"),
             (Qt.ShiftModifier, Qt.Key_C)         : (self.center_view_on_central_item, (False, True),  "toggle view centering on central item"              ),
@@ -302,8 +321,7 @@ class USpace(munqy.MQSpace):
         if self.player_item is not None:
             if self.main_view.view_center_item is self.player_item:
                 self.main_view.view_center_item = item
-            if self.tracing_item is self.player_item:
-                self.tracing_item = item
+            self.transfer_trace(self.player_item, item)
         super().set_player_item(item)
         actions_by_single_key = {
             (Qt.NoModifier, Qt.Key_T)            : (self.toggle_trace, (item,),  "toggle trace"                 ),
@@ -322,25 +340,18 @@ class USpace(munqy.MQSpace):
         }
         self.add_key_mapping(actions_by_single_key, actions_by_repeat_key)
 
-    def collides(self, arbiter, space, data):
-        """
-        #print(arbiter.shapes)
-        for shape in arbiter.shapes:
-            #self.remove_item(shape.body)
-            self.items_to_remove.add(shape.body)
-        """
-        Sound.hit1.play_once()
-        (particle_shape, shape) = arbiter.shapes
-        self.items_to_remove.add(particle_shape.body)
-        if isinstance(shape.body, (munqy.CircleItem, munqy.PolygonItem)):
-            Sound.hit3.play_once()
-            #self.items_to_remove.add(shape.body)
-            shape.body.set_transient(0.25, with_fading=True)
-            # NOK - shall be defered
-            #shape.body.body_type = munqy.KINEMATIC
-            uspace.items_to_set_kinematic.add(shape.body)
-            #shape.body.is_airy = True
-        #return True
+    def collides(self, bullets, items, events):
+        for (bullet, item, contact_point) in zip(bullets, items, events["contact_point"]):
+            Sound.hit1.play_once(position=contact_point)
+            # the space can be modified, since collision events are dispatched after the physics step
+            self.remove_item(bullet)
+            if isinstance(item, (munqy.CircleItem, munqy.PolygonItem)):
+                Sound.hit3.play_once(position=item.position)
+                item.set_transient(0.25, with_fading=True)
+                # NOK - shall be defered
+                #item.body_type = munqy.KINEMATIC
+                self.items_to_set_kinematic.add(item)
+                #item.is_airy = True
 
     """
     def do_key_press_event(self,key):
@@ -496,11 +507,7 @@ class AbstractSpacecraftItem(munqy.CompoundItem):
         (dx, dy) = (cos(a), sin(a))
         v = uniform(0.5, 1.5) * 1e-13 * hypot(fx, fy)
         velocity = (vx + v * dx, vy + v * dy)
-        uspace.add_item(ParticleItem(position, velocity,
-                                     brush=AbstractSpacecraftItem.wind_brush,
-                                     #density=8.0e12, elasticity=0.65, friction=1,
-                                     density=1, elasticity=0, friction=0,
-                                     duration_s=0.2, with_fading=True))
+        uspace.exhaust_particles.emit(position, velocity, lifetime=0.2)
 
     def stabilize(self):
         # TODO
@@ -596,16 +603,10 @@ class SpacecraftItem(AbstractSpacecraftItem):
         self.bomb_ready_time = time
         self.collision_function = self.collides
 
-    def collides(self, arbiter, space, data):
-        # (shape_a, shape_b) = arbiter.shapes
-        # relative_speed = (shape_b.body.velocity-shape_a.body.velocity).length
-        (body_a, body_b) = arbiter.bodies
-        #relative_speed = (body_b.velocity-body_a.velocity).length
-        contact_point = arbiter.contact_point_set.points[0]
-        relative_speed = (body_b.velocity_at_world_point(contact_point.point_b)
-                        - body_a.velocity_at_world_point(contact_point.point_a)).length
+    def collides(self, spacecraft_items, items, events):
+        # the collisions of the step are merged in one sound, the loudest
+        relative_speed = events["relative_speed"].max()
         Sound.hit1.play_once(volume=relative_speed ** 2 / 2e6)
-        return True
 
     def thrust_up(self):
         Sound.thrust4.play_long()
@@ -635,13 +636,9 @@ class SpacecraftItem(AbstractSpacecraftItem):
             (dx, dy) = (cos(a), sin(a))
             vx += BULLET_SPEED * dx
             vy += BULLET_SPEED * dy
-            bullet = Bullet((x + 22 * dx - 4 * dy, y + 22 * dy + 4 * dx), a, (vx, vy),
-                            delay_s=BULLET_LIFETIME_S)
-            uspace.add_item(bullet)
-            uspace.add_circle_item(bullet.position, 0.0,  # velocity=self.velocity,
-                                   radius=2, brush=SpacecraftItem.fire_brush,
-                                   body_type=munqy.KINEMATIC, is_airy=True,
-                                   duration_s=0.15, with_fading=True)
+            bullet = uspace.spawn_item(Bullet, (x + 22 * dx - 4 * dy, y + 22 * dy + 4 * dx), a, (vx, vy),
+                                       delay_s=BULLET_LIFETIME_S)
+            uspace.spawn_item(FireFlash, bullet.position, 0.0)
             self.apply_impulse_at_local_point((-16e15, 0.0), (+16, 8))
 
     def drop_bomb(self):
@@ -743,12 +740,6 @@ class SpacecraftItemOSC(AbstractSpacecraftItem):
         self.activate_thruster((+0.25e16, 0.0), (-12, 0))
 
 
-class ParticleItem(munqy.CircleItem):
-
-    def __init__(self, position, velocity, brush, **kwds):
-        munqy.CircleItem.__init__(self, position, 0.0, velocity=velocity, radius=0.75, brush=brush, **kwds)
-
-
 class MovingPlatform(munqy.SegmentItem):
 
     __slots__ = ("_ax", "_ay", "_t")
@@ -789,6 +780,21 @@ class Bullet(munqy.SegmentItem):
                                    color=Qt.yellow, density=4.0e10, elasticity=0.25, friction=0.5,
                                    duration_s=delay_s, with_fading=True)
 
+    def reset(self, position, angle, velocity, delay_s):
+        munqy.SegmentItem.reset(self, position, angle, velocity=velocity, duration_s=delay_s, with_fading=True)
+
+
+class FireFlash(munqy.CircleItem):
+
+    def __init__(self, position, angle):
+        munqy.CircleItem.__init__(self, position, angle, radius=2, brush=SpacecraftItem.fire_brush,
+                                  body_type=munqy.KINEMATIC, is_airy=True,
+                                  duration_s=0.15, with_fading=True)
+
+    def reset(self, position, angle):
+        munqy.CircleItem.reset(self, position, angle, duration_s=0.15, with_fading=True)
+
+
 class Bomb(munqy.SegmentItem):
 
     brush = QBrush(QColor(255, 155, 155))
@@ -801,30 +807,44 @@ class Bomb(munqy.SegmentItem):
 
     def do_finalize(self):
         #uspace.beep(200, 250)
-        Sound.explosion2.play_once(volume=400000/uspace.distance_player_item(self)**2)
+        Sound.explosion2.play_once(position=self.position)
         #winsound.Beep(440,250)
         #winsound.PlaySound("explosion1.wav",winsound.SND_ASYNC)
         (x,y) = self.position
-        (vx,vy) = self.velocity
         # TODO
         #space = self.qg_item.scene()
-        uspace.add_circle_item(self.position,0.0,#velocity=self.velocity,
-                       radius=30,brush=Bomb.brush,
-                       body_type=munqy.KINEMATIC,is_airy=True,
-                       duration_s=0.5,with_fading=True)
-        for _ in range(50):
-            a = uniform(0, 2*pi)
-            (dx,dy) = (cos(a), sin(a))
-            position = (x+2*dx, y+2*dy)
-            v = uniform(0.5, 1.5) * 1e3
-            velocity = (vx+v*dx, vy+v*dy)
-            uspace.add_item(ParticleItem(position,velocity,Bomb.brush,
-                                         density=4.0e12, elasticity=0.65, friction=1,
-                                         duration_s=0.3))
-
-#QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
-munqy.WIREFRAME_MODE = sys.argv[-1].startswith("w")
-munqy.WIREFRAME_OPAQUE = sys.argv[-1].endswith("o") 
-uspace = USpace()
-uspace.show()
-uspace.start()
+        uspace.spawn_item(BombFlash, self.position, 0.0)
+        uspace.debris_particles.emit_burst(self.position, self.velocity, 50, speed_range=(0.5e3, 1.5e3),
+                                           lifetime=0.3, offset=2)
+        # debris particles are only visual: the blast is applied as impulses on the nearby dynamic items
+        blasted_items = set(info.shape.body for info in uspace.point_query(self.position, BOMB_BLAST_RADIUS,
+                                                                           pymunk.ShapeFilter()))
+        for item in blasted_items:
+            if item is not self and item.body_type == munqy.DYNAMIC:
+                (dx, dy) = (item.position.x - x, item.position.y - y)
+                d = hypot(dx, dy)
+                if 0 < d < BOMB_BLAST_RADIUS:
+                    f = BOMB_BLAST_IMPULSE * (1 - d / BOMB_BLAST_RADIUS) / d
+                    item.apply_impulse_at_world_point((f * dx, f * dy), item.position)
+
+
+class BombFlash(munqy.CircleItem):
+
+    def __init__(self, position, angle):
+        munqy.CircleItem.__init__(self, position, angle, radius=30, brush=Bomb.brush,
+                                  body_type=munqy.KINEMATIC, is_airy=True,
+                                  duration_s=0.5, with_fading=True)
+
+    def reset(self, position, angle):
+        munqy.CircleItem.reset(self, position, angle, duration_s=0.5, with_fading=True)
+
+
+uspace = None
+
+if __name__ == "__main__":
+    #QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
+    munqy.WIREFRAME_MODE = sys.argv[-1].startswith("w")
+    munqy.WIREFRAME_OPAQUE = sys.argv[-1].endswith("o")
+    uspace = USpace()
+    uspace.show()
+    uspace.start()
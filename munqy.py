@@ -4,11 +4,20 @@
 # --------------------------------------------------------------------------------
 
 import sys
-from math import degrees, hypot, atan2
-from itertools import islice
+import os
+import hashlib
+import zipfile
+import json
+from time import perf_counter
+# start time of munqy import, for the startup profile
+_import_start_time = perf_counter()
+from math import degrees, hypot, atan2, ceil, floor, log2, sqrt
+from collections import OrderedDict
+from heapq import heappush, heappop
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
+import numpy as np
 import pymunk
 import pymunk.autogeometry
 # try:
@@ -22,14 +31,97 @@ from sound import Sound
 SIMULATION_TIME_STEP = 5e-3  # in sec
 TIMER_ELAPSE = 10e-3  # in sec
 DELTA_ELAPSE = 1e-3  # in sec
+# maximum number of simulation steps per timer event (when late, the simulation slows down instead of catching up)
+MAX_STEPS_PER_FRAME = 8
+# if True, rendered positions are interpolated between the last two simulation states
+RENDER_INTERPOLATION = True
+# if True, the graphics items of the moving items farther than SYNC_CULLING_MARGIN (in scene units) from the visible
+# rectangle of every view are not updated: they are marked as stale and updated when they come back near a view
+SYNC_CULLING = True
+SYNC_CULLING_MARGIN = 1000
 WIREFRAME_MODE = False
 WIREFRAME_OPAQUE = False
+# number of frames between two points of a trail, maximum number of points of a trail (the oldest ones are dropped)
+# and fading of the trails with age
 TRACE_LENGTH = 10
+TRAIL_CAPACITY = 500
+TRAIL_FADING = True
+# number of opacity levels used for fading transient items
+FADING_LEVELS = 32
 MOUSE_BUTTON = 0x40000000
 UNIVERSE_SIZE = 100000
 HIDE_CURSOR_DELAY = 2   # in sec
 ANTIALIASING = True
 SHOW_VELOCITY = False
+# number of last frames kept by the frame profiler, for computing percentiles
+PROFILER_WINDOW_SIZE = 256
+# number of frames between two refreshes of the performance HUD
+HUD_REFRESH_PERIOD = 20
+# directory of the cache of convex decompositions and marched levels (None for no cache)
+GEOMETRY_CACHE_DIR = ".munqy_cache"
+# tolerance of pymunk's convex decomposition of polygons
+CONVEX_DECOMPOSITION_TOLERANCE = 0.1
+# minimum number of vertices of a polygon for its convex decomposition to be kept in the geometry cache (smaller
+# polygons are decomposed faster than read from disk) and maximum number of decompositions kept in memory
+GEOMETRY_CACHE_MIN_VERTICES = 128
+CONVEX_DECOMPOSITION_MEMO_SIZE = 256
+# version of the level records given by compile_level, to be incremented when these change, so that the compiled
+# levels of the geometry cache are not used anymore
+LEVEL_COMPILER_VERSION = 1
+# size (in cells) of the square chunks of a ChunkedMatrixItem
+MATRIX_CHUNK_SIZE = 64
+# distance (in scene units) around the player and the view within which chunks are activated
+CHUNK_ACTIVATION_RADIUS = 1000
+# distance (in scene units) beyond which chunks are deactivated (greater than CHUNK_ACTIVATION_RADIUS, for hysteresis)
+CHUNK_DEACTIVATION_RADIUS = 1500
+# index of the scene's graphics items: "bsp" (Qt's BSP tree), "none" (no index, every item is considered when
+# painting) or "hybrid" (no index for the scene, whose static items are moved into a BSP-indexed static layer)
+SCENE_INDEX = "bsp"
+# depth of the BSP trees (0 for Qt's automatic depth)
+SCENE_BSP_DEPTH = 0
+# if True, the time spent in scene index maintenance and item lookup is measured at each frame
+SCENE_INDEX_PROFILE = "MUNQY_SCENE_INDEX_PROFILE" in os.environ
+# render quality presets, from the finest to the fastest: antialiasing, viewport update mode, QGraphicsView
+# optimization flags and size (in pixels) under which the moving items are drawn as single points (0 for never)
+RENDER_PRESETS = {
+    "high": {"antialiasing": ANTIALIASING,
+             "viewport_update_mode": QGraphicsView.MinimalViewportUpdate,
+             "optimization_flags": 0,
+             "lod_threshold": 0.0},
+    "medium": {"antialiasing": ANTIALIASING,
+               "viewport_update_mode": QGraphicsView.FullViewportUpdate,
+               "optimization_flags": QGraphicsView.DontSavePainterState,
+               "lod_threshold": 2.0},
+    "low": {"antialiasing": False,
+            "viewport_update_mode": QGraphicsView.FullViewportUpdate,
+            "optimization_flags": QGraphicsView.DontSavePainterState | QGraphicsView.DontAdjustForAntialiasing,
+            "lod_threshold": 4.0},
+}
+RENDER_PRESET = "high"
+# if True, the render preset is lowered when the median paint time exceeds RENDER_PAINT_BUDGET and raised back
+# when it is below RENDER_PAINT_BUDGET * RENDER_PRESET_UPGRADE_RATIO, as checked every RENDER_PRESET_CHECK_PERIOD
+AUTO_RENDER_PRESET = True
+RENDER_PAINT_BUDGET = 6e-3  # in sec
+RENDER_PRESET_UPGRADE_RATIO = 0.4
+RENDER_PRESET_CHECK_PERIOD = 60  # in frames
+# period (in frames) of the search of the items to draw as points, and size (in pixels) of these points
+LOD_UPDATE_PERIOD = 15
+LOD_POINT_SIZE = 2.0
+# if True, the static items are put in a static layer (as with the "hybrid" index, whatever SCENE_INDEX), which is
+# painted from cached tiles of STATIC_TILE_SIZE pixels, rendered once per zoom bucket (half power of 2); at most
+# STATIC_TILE_CACHE_SIZE tiles are kept, the least recently painted ones being dropped first; this pays off for
+# levels with heavy static geometry only, the blit of the tiles costing about as much as simple vector paths
+STATIC_TILE_CACHE = False
+STATIC_TILE_SIZE = 256
+STATIC_TILE_CACHE_SIZE = 128
+# if True, the time to first frame is printed, with the duration of each startup phase
+STARTUP_PROFILE = "MUNQY_STARTUP_PROFILE" in os.environ
+# if False, sound effects are replaced by silent ones (they are always silent in headless mode)
+SOUND_ENABLED = True
+# maximum number of collision events recorded in a simulation step (the next ones are dropped)
+COLLISION_EVENT_CAPACITY = 1024
+# minimum number of items added or removed by MQSpace.add_items/remove_items for suspending the scene index
+BATCH_INDEX_SUSPENSION_THRESHOLD = 200
 MOUSE_HOOK_RADIUS = 20
 # value to set in pymunk.Space.collision_bias (None means pymunk default)
 #COLLISION_BIAS = None
@@ -46,13 +138,15 @@ class Item(pymunk.Body):
         in a display). See MQSpace class, inheriting pymunk's Space and PyQt's
         QGraphicsScene.
         After each pymunk simulation step, QGraphicsItem's position and rotation are
-        updated according to the shape's.
+        updated according to the shape's, for the items that moved (see MQSpace.sync_qg_items).
     """
 
-    __slots__ = ('shaqe', 'qg_item', 'child_shapes', 'is_alive', 'fading_time', 'end_time', 'collision_function',
-                 'original_velocity_func', 'qg_line_item_velocity')
+    __slots__ = ('shaqe', 'qg_item', 'child_shapes', 'is_alive', 'fading_time', 'end_time', 'with_fading',
+                 'transient_group', 'collision_function', 'original_velocity_func', 'qg_line_item_velocity',
+                 'synced_transform', 'previous_transform', 'pool', 'liquid_callbacks', 'extent_radius')
 
-    transient_items = []
+    # if True, the item's update_streaming method is called at each frame (see ChunkedMatrixItem)
+    is_streamed = False
 
     def do_initialize(self):
         pass
@@ -60,9 +154,9 @@ class Item(pymunk.Body):
     def do_finalize(self):
         pass
 
-    def do_fading(self):
-        if self.end_time is not None:
-            self.qg_item.setOpacity((max(0.0, self.end_time - space.time)) / (self.end_time - self.fading_time))
+    def do_fading(self, opacity):
+        if self.qg_item is not None:
+            self.qg_item.setOpacity(opacity)
 
     def __init__(self, position, angle, shaqe, **kwargs):
         mass = kwargs.pop("mass", 0.0)
@@ -78,7 +172,6 @@ class Item(pymunk.Body):
             # TODO
             self.body = space.static_body
         else:
-            self.position_func = self.__class__._position_func
             if velocity is not None:
                 self.velocity = velocity
             if angular_velocity is not None:
@@ -91,20 +184,26 @@ class Item(pymunk.Body):
         self.child_shapes = shaqe.shapes
         self.qg_item = shaqe.qg_item
         self.set_body(self.body)
-        if position is not None:
+        # (x, y, angle) last copied into qg_item, None if qg_item shall be updated at next sync
+        self.synced_transform = None
+        # (x, y, angle) before the last simulation step, used for render interpolation
+        self.previous_transform = None
+        # radius of the circle around the item's origin enclosing its graphics item, computed at first need
+        self.extent_radius = None
+        if position is not None and self.qg_item is not None:
             self.qg_item.setPos(*position)
             self.qg_item.setRotation(degrees(angle))
         self.qg_line_item_velocity = None
-        if SHOW_VELOCITY:
+        if SHOW_VELOCITY and self.qg_item is not None:
             self.qg_line_item_velocity = QGraphicsLineItem(0, 0, 0, 0)
             self.qg_line_item_velocity.setPen(Shaqe.VELOCITY_PEN)
-        #self.original_velocity_func = None
-        if space.attractive_item is not None:
-            self.velocity_func = Item._central_gravity_velocity_func
         self.original_velocity_func = self.velocity_func
         self.is_alive = False
         self.fading_time = None
         self.end_time = None
+        self.with_fading = False
+        self.transient_group = None
+        self.pool = None
         duration_s = kwargs.get("duration_s")
         if duration_s is not None:
             with_fading = kwargs.get("with_fading", False)
@@ -113,6 +212,8 @@ class Item(pymunk.Body):
         if body_type == KINEMATIC:
             space.kinematic_items.append(self)
         self.collision_function = None
+        # (enter_liquid, exit_liquid) functions if the item is a liquid, called through the collision registry
+        self.liquid_callbacks = None
         liquid_damping = self.shaqe.liquid_damping
         if liquid_damping is not None:
             rotational_liquid_damping = 1.0 - (1.0-liquid_damping) / 2.0
@@ -125,106 +226,93 @@ class Item(pymunk.Body):
                 body.angular_velocity *= rotational_liquid_damping
                 force = gravity - relative_velocity * (1.0 - liquid_damping) / dt
                 body.original_velocity_func(body, force, 1.0, dt)
-            def enter_liquid(arbiter, space, data):
-                (body_a, body_b) = arbiter.bodies
-                assert body_a is self
-                #if body_a is self and isinstance(body_b, Item): # and body_b.body_type == DYNAMIC:
-                if isinstance(body_b, Item) and body_b.body_type == DYNAMIC:
-                    #print("enter_liquid", body_a is self, type(body_a), body_a, type(body_b), body_b)
-                    body_b.velocity_func = damping_velocity_func
-                    if body_b is space.player_item:
-                        contact_point = arbiter.contact_point_set.points[0]
-                        relative_speed = (body_b.velocity_at_world_point(contact_point.point_b)
-                                          - body_a.velocity_at_world_point(contact_point.point_a)).length
+            # body is the other body of the arbiter, whatever the order of its shapes (see CollisionRegistry)
+            def enter_liquid(arbiter, body):
+                if isinstance(body, Item) and body.body_type == DYNAMIC:
+                    body.velocity_func = damping_velocity_func
+                    if body is space.player_item:
+                        contact_point = arbiter.contact_point_set.points[0].point_a
+                        relative_speed = (body.velocity_at_world_point(contact_point)
+                                          - self.velocity_at_world_point(contact_point)).length
                         Sound.water1.play_once(volume=relative_speed ** 2 / 2e6)
-                return False
-            def exit_liquid(arbiter, space, data):
-                try:
-                    (body_a, body_b) = arbiter.bodies
-                except AssertionError:
-                    pass
-                else:
-                    if isinstance(body_b, Item) and body_b.body_type == DYNAMIC:
-                        #print("exit_liquid", body_a is self, type(body_a), body_a, type(body_b), body_b)
-                        if body_b is space.player_item:
-                            Sound.water3.play_once(volume=0.05)
-                        body_b.velocity_func = body_b.original_velocity_func
-            #print(self)
+            def exit_liquid(arbiter, body):
+                # body is None if the separation comes from the other item's removal
+                if isinstance(body, Item) and body.body_type == DYNAMIC:
+                    if body is space.player_item:
+                        Sound.water3.play_once(volume=0.05)
+                    body.velocity_func = body.original_velocity_func
+            self.liquid_callbacks = (enter_liquid, exit_liquid)
+            liquid_collision_type = space.collision_registry.collision_type("liquid")
             for child_shape in self.child_shapes:
-                print(child_shape.collision_type)
-                space.on_collision(child_shape.collision_type, None, begin=enter_liquid,
-                                                                     separate=exit_liquid)
+                child_shape.collision_type = liquid_collision_type
+            space.collision_registry.register_liquid(space)
 
     def set_body(self, body):
         for child_shape in self.child_shapes:
             child_shape.body = body
-            child_shape.collision_type = id(body.__class__)
-            #child_shape.collision_type = id(body)
-
-    def _position_func(self, dt):
-        Item.update_position(self, dt)
-        if UNIVERSE_SIZE is not None and (abs(self.position.x) > UNIVERSE_SIZE or abs(self.position.y) > UNIVERSE_SIZE):
-            space.remove_item(self)
-        else:
-            self.qg_item.setPos(*self.position)
-            self.qg_item.setRotation(degrees(self.angle))
-            if self.qg_line_item_velocity is not None:
-                self.qg_line_item_velocity.setLine(self.position.x, self.position.y,
-                                                   self.position.x + self.velocity.x/10, self.position.y + self.velocity.y/10)
-
-    def _central_gravity_velocity_func(self, gravity, damping, dt):
+            child_shape.collision_type = space.collision_registry.collision_type(body.__class__)
+
+    def sync_qg_item(self, x, y, angle):
+        self.qg_item.setPos(x, y)
+        self.qg_item.setRotation(degrees(angle))
+        if self.qg_line_item_velocity is not None:
+            (vx, vy) = self.velocity
+            self.qg_line_item_velocity.setLine(x, y, x + vx/10, y + vy/10)
+
+    def is_out_of(self, rect):
+        """ returns True if the item's graphics item, whatever its rotation, lies entirely out of the given
+            (x_min, y_min, x_max, y_max) rectangle; its extent is measured once, by its bounding rect (the streamed
+            items, whose extent varies, are never culled)
+        """
+        radius = self.extent_radius
+        if radius is None:
+            bounding_rect = self.qg_item.boundingRect()
+            radius = self.extent_radius = hypot(max(-bounding_rect.left(), bounding_rect.right()),
+                                                max(-bounding_rect.top(), bounding_rect.bottom()))
         (x, y) = self.position
-        (cx, cy) = space.attractive_item.position
-        dx = cx - x
-        dy = cy - y
-        d3 = hypot(dx, dy) ** 3
-        if d3 > 0.0:
-            # Newton's law of gravitation
-            f = space.attractive_item_force / hypot(dx, dy) ** 3
-            # shell theorem: if the body is inside the sphere (c < 1), then only the inner sphere's mass shall be considered
-            c = d3 / space.attractive_item_radius ** 3
-            if c < 1:
-                f *= c
-            #pymunk.Body.update_velocity(self, (f * dx, f * dy), damping, dt)
-            pymunk.Body.update_velocity(self, (gravity.x + f * dx, gravity.y + f * dy), damping, dt)
+        (x_min, y_min, x_max, y_max) = rect
+        return x + radius < x_min or x - radius > x_max or y + radius < y_min or y - radius > y_max
 
     @staticmethod
     def remove_transient_items():
-        if len(Item.transient_items) == 0:
-            return
-        t = space.time
-        first_kept_idx = len(Item.transient_items) + 1
-        for (idx, (t1, items)) in enumerate(Item.transient_items):
-            if t < t1:
-                first_kept_idx = idx
-                break
-        if first_kept_idx > 0:
-            for (_, items) in islice(Item.transient_items, first_kept_idx):
-                for item in items:
-                    space.remove_item(item)
-            del Item.transient_items[:first_kept_idx]
-        for (_, items) in Item.transient_items:
-            for item in items:
-                if item.with_fading:
-                    item.do_fading()
+        space.transient_scheduler.remove_expired_items(space.time)
 
     def set_transient(self, duration_s, with_fading=False):
         Item.set_all_transient((self,), duration_s, with_fading)
 
     @staticmethod
     def set_all_transient(items, duration_s, with_fading=False):
-        fading_time = space.time
-        end_time = fading_time + duration_s
-        for item in items:
-            item.fading_time = fading_time
-            item.with_fading = with_fading
-            item.end_time = end_time
-        insert_idx = len(Item.transient_items)
-        for (idx, (t, _)) in enumerate(Item.transient_items):
-            if end_time <= t:
-                insert_idx = idx
-                break
-        Item.transient_items.insert(insert_idx, (end_time, items))
+        if space.static_layer is not None:
+            # the static layer is not repainted when its items fade
+            items = tuple(items)
+            for item in items:
+                if item.body_type == STATIC:
+                    space.move_to_dynamic_layer(item)
+        space.transient_scheduler.schedule(items, space.time, space.time + duration_s, with_fading)
+
+    def reset(self, position, angle, velocity=None, angular_velocity=None, duration_s=None, with_fading=False):
+        """ resets the state of a removed item, so that it can be added again (see MQSpace.spawn_item);
+            subclasses having specific constructor arguments shall override this method accordingly
+        """
+        assert not self.is_alive
+        self.body.position = position
+        self.body.angle = angle
+        if self.body_type != STATIC:
+            self.velocity = (0.0, 0.0) if velocity is None else velocity
+            self.angular_velocity = 0.0 if angular_velocity is None else angular_velocity
+            self.force = (0.0, 0.0)
+            self.torque = 0.0
+            self.velocity_func = self.original_velocity_func
+        if self.qg_item is not None:
+            self.qg_item.setPos(*position)
+            self.qg_item.setRotation(degrees(angle))
+            self.qg_item.setOpacity(1.0)
+        self.fading_time = None
+        self.end_time = None
+        self.with_fading = False
+        self.transient_group = None
+        if duration_s is not None:
+            self.set_transient(duration_s, with_fading)
 
     def declare_kinematic(self):
         space.items_to_set_kinematic.add(self)
@@ -233,10 +321,115 @@ class Item(pymunk.Body):
         pass
 
 
+class ItemPool:
+    """ ItemPool keeps removed items of a given class, up to a given size, so that they can be reused
+        instead of being reallocated (see MQSpace.set_pool_size and MQSpace.spawn_item)
+    """
+
+    __slots__ = ("size", "free_items", "nb_hits", "nb_misses", "nb_discarded")
+
+    def __init__(self, size):
+        self.size = size
+        self.free_items = []
+        self.nb_hits = 0
+        self.nb_misses = 0
+        self.nb_discarded = 0
+
+    def acquire(self):
+        if len(self.free_items) > 0:
+            self.nb_hits += 1
+            return self.free_items.pop()
+        self.nb_misses += 1
+        return None
+
+    def release(self, item):
+        if len(self.free_items) < self.size:
+            self.free_items.append(item)
+        else:
+            self.nb_discarded += 1
+
+    def statistics(self):
+        return {"size": self.size, "free": len(self.free_items), "hits": self.nb_hits, "misses": self.nb_misses,
+                "discarded": self.nb_discarded}
+
+
+class TransientGroup:
+    """ TransientGroup is a group of transient items sharing the same end time and fading
+    """
+
+    __slots__ = ("items", "fading_time", "end_time", "fading_level")
+
+    def __init__(self, items, fading_time, end_time):
+        self.items = items
+        self.fading_time = fading_time
+        self.end_time = end_time
+        self.fading_level = FADING_LEVELS
+
+
+class TransientScheduler:
+    """ TransientScheduler handles the removal of transient items at their end time, as well as their fading;
+        - groups of items are kept in a heap ordered by end time: O(log n) insertion, O(expired) removal,
+        - fading groups are kept in a second heap ordered by the time of their next opacity change, the opacity
+          being quantized in FADING_LEVELS levels: at each tick, only the groups whose opacity actually changes
+          are updated, with one opacity computation per group
+        An item that is removed or made transient again before its end time is simply ignored when its group expires.
+    """
+
+    __slots__ = ("expiration_heap", "fading_heap", "counter")
+
+    def __init__(self):
+        self.expiration_heap = []
+        self.fading_heap = []
+        # tie-breaker for groups having the same time
+        self.counter = 0
+
+    def schedule(self, items, fading_time, end_time, with_fading=False):
+        group = TransientGroup(tuple(items), fading_time, end_time)
+        for item in group.items:
+            item.fading_time = fading_time
+            item.end_time = end_time
+            item.with_fading = with_fading
+            item.transient_group = group
+        self.counter += 1
+        heappush(self.expiration_heap, (end_time, self.counter, group))
+        if with_fading and end_time > fading_time:
+            heappush(self.fading_heap, (fading_time + (end_time - fading_time) / FADING_LEVELS, self.counter, group))
+
+    def remove_expired_items(self, t):
+        expiration_heap = self.expiration_heap
+        while len(expiration_heap) > 0 and expiration_heap[0][0] <= t:
+            group = heappop(expiration_heap)[2]
+            expired_items = [item for item in group.items if item.transient_group is group]
+            for item in expired_items:
+                item.transient_group = None
+            space.remove_items(expired_items)
+        fading_heap = self.fading_heap
+        while len(fading_heap) > 0 and fading_heap[0][0] <= t:
+            (_, counter, group) = heappop(fading_heap)
+            duration = group.end_time - group.fading_time
+            fading_level = min(group.fading_level - 1, ceil((group.end_time - t) / duration * FADING_LEVELS))
+            if fading_level <= 0:
+                # the group is expired, or about to be
+                continue
+            group.fading_level = fading_level
+            opacity = fading_level / FADING_LEVELS
+            for item in group.items:
+                if item.transient_group is group:
+                    item.do_fading(opacity)
+            heappush(fading_heap, (group.end_time - (fading_level - 1) * duration / FADING_LEVELS, counter, group))
+
+
+def is_headless():
+    """ returns True if the current space is headless: the Shaqe instances then have no QGraphicsItem (qg_item is
+        None), since Qt's fonts and pixmaps cannot be created without a QGuiApplication
+    """
+    return space is not None and space.headless
+
+
 class Shaqe:
     """ Shake is an abstract class. Each subclass allows defining some Item subclass through
         - the item's shapes (used in particular by pymunk for collision handling),
-        - the item's graphical representation, as a PyQt QGraphicsItem
+        - the item's graphical representation, as a PyQt QGraphicsItem (None in headless mode)
     """
 
     __slots__ = ("qg_item", "shapes", "liquid_damping")
@@ -274,6 +467,8 @@ class Shaqe:
                 #shape.collision_type = 0
 
     def set_pen(self, pen):
+        if self.qg_item is None:
+            return
         if pen is None:
             if WIREFRAME_MODE and pen is None:
                 pen = Shaqe.WIREFRAME_PEN
@@ -282,6 +477,8 @@ class Shaqe:
         self.qg_item.setPen(pen)
 
     def set_brush(self, brush):
+        if self.qg_item is None:
+            return
         if WIREFRAME_MODE:
             brush = Qt.black if WIREFRAME_OPAQUE else Shaqe.NO_BRUSH
         elif brush is None:
@@ -296,10 +493,8 @@ class CircleShaqe(Shaqe):
     def __init__(self, radius, offset=(0.0, 0.0), is_airy=False, **kwargs):
         shapes = (pymunk.Circle(None, radius, offset),) if not is_airy else ()
         (rx, ry) = offset
-        Shaqe.__init__(self,
-                       QGraphicsEllipseItem(rx - radius, ry - radius, 2 * radius, 2 * radius),
-                       *shapes,
-                       **kwargs)
+        qg_item = None if is_headless() else QGraphicsEllipseItem(rx - radius, ry - radius, 2 * radius, 2 * radius)
+        Shaqe.__init__(self, qg_item, *shapes, **kwargs)
 
 
 class CircleItem(Item):
@@ -325,8 +520,8 @@ class RectShaqe(Shaqe):
         shapes = (pymunk.Poly(None, vertices),) if not is_airy else ()
         pen = kwargs.get("pen")
         d = 0.0 if pen is None or pen.style() == Qt.NoPen or WIREFRAME_MODE else pen.widthF()
-        Shaqe.__init__(self, QGraphicsRectItem(rx - w2 + d / 2.0, ry - h2 + d / 2.0, w - d, h - d),
-                       *shapes, **kwargs)
+        qg_item = None if is_headless() else QGraphicsRectItem(rx - w2 + d / 2.0, ry - h2 + d / 2.0, w - d, h - d)
+        Shaqe.__init__(self, qg_item, *shapes, **kwargs)
 
 
 class RectItem(Item):
@@ -342,22 +537,37 @@ class TextShaqe(Shaqe):
     """ TextShaqe is a Shaqe subclass for defining a text item with a given font
     """
 
+    # in headless mode, without font metrics, average character width and line height, in font sizes,
+    # and font size (in pixels) if none is given
+    HEADLESS_CHAR_WIDTH = 0.6
+    HEADLESS_LINE_HEIGHT = 1.2
+    HEADLESS_FONT_SIZE = 13
+
     def __init__(self, text, font_size=None, font_family=None, offset=(0.0, 0.0), is_airy=False, **kwargs):
-        qg_text_item = QGraphicsSimpleTextItem(text)
-        if font_size is not None:
-            font = qg_text_item.font()
-            font.setPixelSize(font_size)
-            qg_text_item.setFont(font)
-        if font_family is not None:
-            font = qg_text_item.font()
-            font.setFamily(font_family)
-            qg_text_item.setFont(font)
-        br = qg_text_item.sceneBoundingRect()
-        (self.width, self.height) = (br.width(), br.height())
+        if is_headless():
+            qg_text_item = None
+            if font_size is None:
+                font_size = TextShaqe.HEADLESS_FONT_SIZE
+            lines = text.split("\n")
+            self.width = TextShaqe.HEADLESS_CHAR_WIDTH * font_size * max(len(line) for line in lines)
+            self.height = TextShaqe.HEADLESS_LINE_HEIGHT * font_size * len(lines)
+        else:
+            qg_text_item = QGraphicsSimpleTextItem(text)
+            if font_size is not None:
+                font = qg_text_item.font()
+                font.setPixelSize(font_size)
+                qg_text_item.setFont(font)
+            if font_family is not None:
+                font = qg_text_item.font()
+                font.setFamily(font_family)
+                qg_text_item.setFont(font)
+            br = qg_text_item.sceneBoundingRect()
+            (self.width, self.height) = (br.width(), br.height())
         w2 = self.width / 2.0
         h2 = self.height / 2.0
         (rx, ry) = offset
-        qg_text_item.setPos(rx - w2, ry - h2)
+        if qg_text_item is not None:
+            qg_text_item.setPos(rx - w2, ry - h2)
         # qg_text_item.setTransform(QTransform().translate(rx-w2,ry-h2))
         vertices = ((rx - w2, ry - h2), (rx - w2, ry + h2), (rx + w2, ry + h2), (rx + w2, ry - h2))
         shapes = (pymunk.Poly(None, vertices),) if not is_airy else ()
@@ -375,51 +585,463 @@ class TextItem(Item):
         Item.__init__(self, position, angle, text_shaqe, **kwargs)
         self.center_pos = (text_shaqe.width / 2.0, text_shaqe.height / 2.0)
 
-    def _position_func(self, dt):
-        Item.update_position(self, dt)
-        (x, y) = self.position
+    def sync_qg_item(self, x, y, angle):
+        # never called in headless mode (see MQSpace.advance)
         (cx, cy) = self.center_pos
-        self.qg_item.setTransform(QTransform().translate(cx, cy).rotate(degrees(self.angle)).translate(-cx, -cy))
+        self.qg_item.setTransform(QTransform().translate(cx, cy).rotate(degrees(angle)).translate(-cx, -cy))
         self.qg_item.setPos(x - cx, y - cy)
 
 
+class GeometryCache:
+    """ GeometryCache is an on-disk cache of computed geometries (e.g. convex decompositions), stored as NumPy npz
+        files in a directory; each entry is addressed by a hash of all the inputs of the computation, so that an
+        entry is never stale: when inputs change, another entry is looked up
+    """
+
+    # to be incremented when the format or the computations change
+    FORMAT_VERSION = 1
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.nb_hits = 0
+        self.nb_misses = 0
+
+    def key(self, kind, *parts):
+        """ returns the key of an entry of given kind, computed from the given parts (bytes, str or numbers)
+        """
+        sha = hashlib.sha1(f"{kind}/{GeometryCache.FORMAT_VERSION}/{pymunk.version}".encode())
+        for part in parts:
+            sha.update(part if isinstance(part, bytes) else repr(part).encode())
+            sha.update(b"/")
+        return f"{kind}-{sha.hexdigest()}"
+
+    def load(self, key):
+        """ returns a dictionary of the NumPy arrays stored under key, or None if there is no such (valid) entry
+        """
+        try:
+            with np.load(os.path.join(self.directory, key + ".npz"), allow_pickle=False) as npz_file:
+                arrays = dict(npz_file)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            self.nb_misses += 1
+            return None
+        self.nb_hits += 1
+        return arrays
+
+    def store(self, key, **arrays):
+        os.makedirs(self.directory, exist_ok=True)
+        filename = os.path.join(self.directory, key + ".npz")
+        # the file is written under a temporary name, so that a concurrent reader never sees a partial file
+        temp_filename = f"{filename}.{os.getpid()}.tmp.npz"
+        np.savez(temp_filename, **arrays)
+        os.replace(temp_filename, filename)
+
+
+def get_geometry_cache():
+    """ returns the GeometryCache in GEOMETRY_CACHE_DIR, or None if GEOMETRY_CACHE_DIR is None
+    """
+    global geometry_cache
+    if GEOMETRY_CACHE_DIR is None:
+        return None
+    if geometry_cache is None or geometry_cache.directory != GEOMETRY_CACHE_DIR:
+        geometry_cache = GeometryCache(GEOMETRY_CACHE_DIR)
+    return geometry_cache
+
+
+def pack_polygons(polygons):
+    """ returns the given sequence of polygons as two NumPy arrays: number of vertices per polygon, vertices
+    """
+    sizes = np.array([len(polygon) for polygon in polygons], dtype=np.int64)
+    vertices = np.array([vertex for polygon in polygons for vertex in polygon], dtype=float).reshape(-1, 2)
+    return (sizes, vertices)
+
+
+def unpack_polygons(sizes, vertices):
+    """ returns the polygons packed by pack_polygons, as a list of tuples of (x, y) tuples
+    """
+    vertices = list(map(tuple, vertices.tolist()))
+    polygons = []
+    start = 0
+    for size in sizes.tolist():
+        polygons.append(tuple(vertices[start:start + size]))
+        start += size
+    return polygons
+
+
+def _convex_decomposition(vertices, tolerance):
+    # pymunk requires clockwise polygons: the other orientation raises AssertionError
+    try:
+        convex_polygons = pymunk.autogeometry.convex_decomposition(vertices, tolerance=tolerance)
+    except AssertionError:
+        vertices = vertices[::-1]
+        convex_polygons = pymunk.autogeometry.convex_decomposition(vertices, tolerance=tolerance)
+    return (vertices, tuple(tuple(map(tuple, convex_polygon)) for convex_polygon in convex_polygons))
+
+
+# last convex decompositions, by (vertices, tolerance), the least recently used first
+_convex_decomposition_memo = OrderedDict()
+
+
+def convex_decomposition(vertices, tolerance=None, with_cache=True):
+    """ returns (vertices, convex_polygons) where vertices is the given polygon, closed and possibly reversed
+        to be clockwise, and convex_polygons is its convex decomposition (with CONVEX_DECOMPOSITION_TOLERANCE
+        if tolerance is None); the last CONVEX_DECOMPOSITION_MEMO_SIZE results are kept in memory; if with_cache
+        is True and the polygon has at least GEOMETRY_CACHE_MIN_VERTICES vertices, the result is also looked up
+        in (or added to) the geometry cache
+    """
+    if tolerance is None:
+        tolerance = CONVEX_DECOMPOSITION_TOLERANCE
+    vertices = list(vertices)
+    if vertices[0] != vertices[-1]:
+        vertices.append(vertices[0])
+    vertices = tuple(map(tuple, vertices))
+    memo_key = (vertices, tolerance)
+    result = _convex_decomposition_memo.get(memo_key)
+    if result is not None:
+        _convex_decomposition_memo.move_to_end(memo_key)
+        return result
+    cache = get_geometry_cache() if with_cache and len(vertices) >= GEOMETRY_CACHE_MIN_VERTICES else None
+    if cache is None:
+        result = _convex_decomposition(vertices, tolerance)
+    else:
+        key = cache.key("convex", np.array(vertices, dtype=float).tobytes(), tolerance)
+        arrays = cache.load(key)
+        if arrays is not None:
+            result = (tuple(map(tuple, arrays["vertices"].tolist())),
+                      tuple(unpack_polygons(arrays["sizes"], arrays["convex_vertices"])))
+        else:
+            result = _convex_decomposition(vertices, tolerance)
+            (sizes, convex_vertices) = pack_polygons(result[1])
+            cache.store(key, vertices=np.array(result[0], dtype=float), sizes=sizes, convex_vertices=convex_vertices)
+    _convex_decomposition_memo[memo_key] = result
+    if len(_convex_decomposition_memo) > CONVEX_DECOMPOSITION_MEMO_SIZE:
+        _convex_decomposition_memo.popitem(last=False)
+    return result
+
+
+def compile_level(svg_filename):
+    """ parses the given SVG level and returns its items as a list of (kind, args) records, made of plain Python
+        values only (colors as ARGB integers) and including the convex decompositions of polygons
+    """
+    from svgelements import SVG, SVGElement, Path, Rect, Text, Circle, Point
+    level_records = []
+    wall_rgba = None
+    svg = SVG.parse(svg_filename)
+    for svg_element in svg.elements():
+        if type(svg_element) is SVGElement:
+            if wall_rgba is None:
+                wall_color_code = svg_element.values.get("pagecolor")
+                if wall_color_code is None:
+                    wall_rgba = QColor(Qt.darkGray).rgba()
+                else:
+                    wall_rgba = QColor(wall_color_code).rgba()
+        elif isinstance(svg_element, Text):
+            # TODO NOK svg_element.text is None (due to "tspan" child)
+            if svg_element.text == "S":
+                true_pos = Point(svg_element.x, svg_element.y) * svg_element.transform
+                level_records.append(("start", {"position": (true_pos.x, true_pos.y)}))
+        elif isinstance(svg_element, Rect):
+            w = svg_element.width
+            h = svg_element.height
+            is_liquid = svg_element.fill.alpha < 255
+            level_records.append(("rect", {
+                "position": (svg_element.x + w / 2, svg_element.y + h / 2),
+                "angle": float(svg_element.rotation),
+                "size": (w, h),
+                "body_type": DYNAMIC if svg_element.id.startswith("m") else (KINEMATIC if is_liquid else STATIC),
+                "liquid_damping": 0.95 if is_liquid else None,
+                "rgba": QColor(svg_element.fill.red, svg_element.fill.green, svg_element.fill.blue,
+                               svg_element.fill.alpha).rgba()}))
+        elif isinstance(svg_element, Circle):
+            assert svg_element.rx == svg_element.ry
+            level_records.append(("circle", {
+                "position": (svg_element.cx, svg_element.cy),
+                "radius": svg_element.rx,
+                "body_type": DYNAMIC if svg_element.id.startswith("m") else STATIC,
+                "rgba": QColor(svg_element.fill.rgb).rgba()}))
+        elif isinstance(svg_element, Path):
+            if svg_element.stroke.rgb is not None:
+                (p1, p2) = tuple(svg_element.as_points())[::2]
+                level_records.append(("segment", {
+                    "start_point": (p1.x, p1.y),
+                    "end_point": (p2.x, p2.y),
+                    "width": svg_element.stroke_width,
+                    "color": svg_element.stroke.rgb}))
+            elif svg_element.fill.rgb > 0:
+                vertices = tuple(tuple(point) for point in tuple(svg_element.as_points())[::2])
+                (vertices, convex_polygons) = convex_decomposition(vertices[::-1])
+                level_records.append(("polygon", {
+                    "position": (0, 0),
+                    "vertices": vertices,
+                    "convex_polygons": convex_polygons,
+                    "body_type": DYNAMIC if svg_element.id.startswith("m") else STATIC,
+                    "density": 0.3e11,
+                    "rgba": QColor(svg_element.fill.rgb).rgba()}))
+            else:
+                BORDER_WIDTH = 1000
+                (x, y, w, h) = svg_element.bbox()
+                inner_vertices = tuple(tuple(point) for point in tuple(svg_element.as_points())[::2])
+                vertices = ((x     - BORDER_WIDTH , y     - BORDER_WIDTH),
+                            (x + w + BORDER_WIDTH , y     - BORDER_WIDTH),
+                            (x + w + BORDER_WIDTH , y + h + BORDER_WIDTH),
+                            (x     - BORDER_WIDTH , y + h + BORDER_WIDTH),
+                            (x     - BORDER_WIDTH+1e-6, y   - BORDER_WIDTH)) \
+                           + inner_vertices + (inner_vertices[0],)
+                (vertices, convex_polygons) = convex_decomposition(vertices)
+                level_records.append(("polygon", {
+                    "position": (x, y),
+                    "vertices": vertices,
+                    "convex_polygons": convex_polygons,
+                    "body_type": STATIC,
+                    "density": None,
+                    "rgba": wall_rgba}))
+    return level_records
+
+
+def _as_tuples(value):
+    # JSON gives lists where the level records have tuples
+    if isinstance(value, list):
+        return tuple(_as_tuples(item) for item in value)
+    if isinstance(value, dict):
+        return {name: _as_tuples(item) for (name, item) in value.items()}
+    return value
+
+
+def get_compiled_level(svg_filename):
+    """ returns the level records of the given SVG file (see compile_level); they are stored in the geometry cache,
+        as a JSON text for the plain values and as packed NumPy arrays for the polygons (no pickle), and this
+        entry is used as long as the SVG file's modification time and size are unchanged; the entry depends on
+        LEVEL_COMPILER_VERSION and CONVEX_DECOMPOSITION_TOLERANCE
+    """
+    cache = get_geometry_cache()
+    if cache is None:
+        return compile_level(svg_filename)
+    svg_stat = os.stat(svg_filename)
+    signature = np.array((svg_stat.st_mtime_ns, svg_stat.st_size), dtype=np.int64)
+    # one entry per SVG file, compiler version and tolerance, replaced when the file changes
+    key = cache.key("level", os.path.abspath(svg_filename), LEVEL_COMPILER_VERSION, CONVEX_DECOMPOSITION_TOLERANCE)
+    arrays = cache.load(key)
+    if arrays is not None and np.array_equal(arrays["signature"], signature):
+        polygons = unpack_polygons(arrays["sizes"], arrays["vertices"])
+        convex_polygons = unpack_polygons(arrays["convex_sizes"], arrays["convex_vertices"])
+        level_records = []
+        polygon_idx = 0
+        start = 0
+        for (kind, args) in _as_tuples(json.loads(str(arrays["records"]))):
+            if kind == "polygon":
+                nb_convex_polygons = int(arrays["nb_convex_polygons"][polygon_idx])
+                args["vertices"] = polygons[polygon_idx]
+                args["convex_polygons"] = tuple(convex_polygons[start:start + nb_convex_polygons])
+                polygon_idx += 1
+                start += nb_convex_polygons
+            level_records.append((kind, args))
+        return level_records
+    level_records = compile_level(svg_filename)
+    # the polygons' geometries are taken apart from the JSON records
+    json_records = []
+    polygon_records = []
+    for (kind, args) in level_records:
+        if kind == "polygon":
+            polygon_records.append(args)
+            args = {name: value for (name, value) in args.items() if name not in ("vertices", "convex_polygons")}
+        json_records.append((kind, args))
+    (sizes, vertices) = pack_polygons([args["vertices"] for args in polygon_records])
+    (convex_sizes, convex_vertices) = pack_polygons([convex_polygon for args in polygon_records
+                                                     for convex_polygon in args["convex_polygons"]])
+    nb_convex_polygons = np.array([len(args["convex_polygons"]) for args in polygon_records], dtype=np.int64)
+    cache.store(key, signature=signature, records=np.array(json.dumps(json_records)), sizes=sizes,
+                vertices=vertices, convex_sizes=convex_sizes, convex_vertices=convex_vertices,
+                nb_convex_polygons=nb_convex_polygons)
+    return level_records
+
+
+def _lerp(f1, f2, t):
+    # same rounding as Chipmunk's cpflerp, for getting identical vertices
+    return f1 * (1.0 - t) + f2 * t
+
+
+# polylines emitted by Chipmunk's cpMarchCellHard, per cell case (bit 0: a, bit 1: b, bit 2: c, bit 3: d, set if
+# above threshold); points are numbered 3 * yi + xi, from their indices in ((x0, xm, x1), (y0, ym, y1))
+_MARCH_HARD_POLYLINES = {
+    0x1: ((3, 4, 1),),
+    0x2: ((1, 4, 5),),
+    0x3: ((3, 5),),
+    0x4: ((7, 4, 3),),
+    0x5: ((7, 1),),
+    0x6: ((1, 4, 3), (7, 4, 5)),
+    0x7: ((7, 4, 5),),
+    0x8: ((5, 4, 7),),
+    0x9: ((5, 4, 1), (3, 4, 7)),
+    0xA: ((1, 7),),
+    0xB: ((3, 4, 7),),
+    0xC: ((5, 3),),
+    0xD: ((5, 4, 1),),
+    0xE: ((1, 4, 3),)}
+
+# segments emitted by Chipmunk's cpMarchCellSoft, per cell case, between the points on the cell edges:
+# 0: (x0, ac) ; 1: (x1, bd) ; 2: (ab, y0) ; 3: (cd, y1)
+_MARCH_SOFT_POLYLINES = {
+    0x1: ((0, 2),),
+    0x2: ((2, 1),),
+    0x3: ((0, 1),),
+    0x4: ((3, 0),),
+    0x5: ((3, 2),),
+    0x6: ((2, 1), (3, 0)),
+    0x7: ((3, 1),),
+    0x8: ((1, 3),),
+    0x9: ((0, 2), (1, 3)),
+    0xA: ((2, 3),),
+    0xB: ((0, 3),),
+    0xC: ((1, 0),),
+    0xD: ((1, 2),),
+    0xE: ((2, 0),)}
+
+
+def _march_segment_table(polylines_by_case):
+    """ returns an array giving, for each of the 16 cell cases, the (up to 4) segments in the order they are
+        collected by Chipmunk, as pairs of point numbers (-1 if no segment); a polyline (a, b, c) is emitted as
+        seg(b, c) then seg(a, b) and each seg(v0, v1) is collected as (v1, v0)
+    """
+    table = np.full((16, 4, 2), -1, dtype=np.intp)
+    for (case, polylines) in polylines_by_case.items():
+        segments = []
+        for polyline in polylines:
+            for (v0, v1) in reversed(tuple(zip(polyline, polyline[1:]))):
+                segments.append((v1, v0))
+        table[case, :len(segments)] = segments
+    return table
+
+
+_MARCH_HARD_SEGMENTS = _march_segment_table(_MARCH_HARD_POLYLINES)
+_MARCH_SOFT_SEGMENTS = _march_segment_table(_MARCH_SOFT_POLYLINES)
+
+
+def matrix_to_array(matrix, char):
+    """ returns a 2D NumPy boolean array telling which cells of the given matrix contain char; the matrix may be
+        a sequence of strings (lines), a bytes object (lines separated by newlines, kept as last cell of each line,
+        as with readlines) or a NumPy array (boolean, of characters or of character codes)
+    """
+    if isinstance(matrix, np.ndarray):
+        if matrix.dtype == bool:
+            return matrix
+        if matrix.dtype.kind in "SU":
+            return matrix == char
+        return matrix == ord(char)
+    if isinstance(matrix, (bytes, bytearray)):
+        matrix = bytes(matrix).splitlines(keepends=True)
+    w = len(matrix[0])
+    h = len(matrix)
+    if isinstance(matrix[0], bytes):
+        codes = np.frombuffer(b"".join(line.ljust(w)[:w] for line in matrix), dtype=np.uint8)
+    else:
+        codes = np.frombuffer("".join(line.ljust(w)[:w] for line in matrix).encode("utf-32-le"), dtype=np.uint32)
+    return codes.reshape(h, w) == ord(char)
+
+
+def march_matrix(samples, threshold=0.5, soft=False):
+    """ returns a pymunk PolylineSet with the contours of the given 2D NumPy array of samples, identical to the one
+        returned by pymunk.autogeometry.march_hard (or march_soft if soft is True) on a bounding box (0, 0, w-1, h-1)
+        with w x h samples, where the sample function at (x, y) is samples[int(y), int(x)];
+        the segments are computed in vectorized form, only their collection in the PolylineSet is done one by one
+    """
+    samples = np.asarray(samples, dtype=float)
+    (h, w) = samples.shape
+    # sampling coordinates, as computed by Chipmunk's cpMarchCells
+    xs = _lerp(0.0, w - 1.0, np.arange(w) * (1.0 / (w - 1)))
+    ys = _lerp(0.0, h - 1.0, np.arange(h) * (1.0 / (h - 1)))
+    samples = samples[np.ix_(ys.astype(int), xs.astype(int))]
+    is_above = samples > threshold
+    cases = (is_above[:-1, :-1] * 0x1 | is_above[:-1, 1:] * 0x2
+             | is_above[1:, :-1] * 0x4 | is_above[1:, 1:] * 0x8)
+    # np.nonzero gives row-major order, which is the order of Chipmunk's cell loops
+    (js, is_) = np.nonzero((cases != 0x0) & (cases != 0xF))
+    cases = cases[js, is_]
+    (x0, x1, y0, y1) = (xs[is_], xs[is_ + 1], ys[js], ys[js + 1])
+    if soft:
+        (a, b, c, d) = (samples[js, is_], samples[js, is_ + 1], samples[js + 1, is_], samples[js + 1, is_ + 1])
+        # the interpolations on edges without crossing are never used
+        with np.errstate(divide="ignore", invalid="ignore"):
+            points = np.stack((np.stack((x0, _lerp(y0, y1, (threshold - a) / (c - a))), axis=-1),
+                               np.stack((x1, _lerp(y0, y1, (threshold - b) / (d - b))), axis=-1),
+                               np.stack((_lerp(x0, x1, (threshold - a) / (b - a)), y0), axis=-1),
+                               np.stack((_lerp(x0, x1, (threshold - c) / (d - c)), y1), axis=-1)), axis=1)
+        segment_table = _MARCH_SOFT_SEGMENTS
+    else:
+        (xm, ym) = (_lerp(x0, x1, 0.5), _lerp(y0, y1, 0.5))
+        points = np.stack([np.stack((x, y), axis=-1) for y in (y0, ym, y1) for x in (x0, xm, x1)], axis=1)
+        segment_table = _MARCH_HARD_SEGMENTS
+    point_idxs = segment_table[cases]
+    is_segment = point_idxs[:, :, 0] >= 0
+    cell_idxs = np.broadcast_to(np.arange(len(cases))[:, None], is_segment.shape)[is_segment]
+    point_idxs = point_idxs[is_segment]
+    segments = np.concatenate((points[cell_idxs, point_idxs[:, 0]], points[cell_idxs, point_idxs[:, 1]]), axis=1)
+    # degenerate segments are skipped, as in Chipmunk's seg
+    segments = segments[np.any(segments[:, :2] != segments[:, 2:], axis=1)]
+    polyline_set = pymunk.autogeometry.PolylineSet()
+    collect_segment = polyline_set.collect_segment
+    for (x_from, y_from, x_to, y_to) in segments.tolist():
+        collect_segment((x_from, y_from), (x_to, y_to))
+    return polyline_set
+
+
 class PolygonShaqe(Shaqe):
     """ PolygonShaqe is a Shaqe subclass for defining a polygon item with given vertices
     """
 
-    def __init__(self, vertices, is_airy=False, **kwargs):
-        vertices = list(vertices)
-        if vertices[0] != vertices[-1]:
-            vertices.append(vertices[0])
-        vertices = tuple(vertices)
-        try:
-            convex_polygons = pymunk.autogeometry.convex_decomposition(vertices, tolerance=0.1)
-        except AssertionError:
-            vertices = vertices[::-1]
-            convex_polygons = pymunk.autogeometry.convex_decomposition(vertices, tolerance=0.1)
+    def __init__(self, vertices, is_airy=False, convex_polygons=None, **kwargs):
+        """ if convex_polygons is given, it shall be the convex decomposition of vertices, which are then taken
+            as is; otherwise, the decomposition is done by convex_decomposition
+        """
+        if convex_polygons is None:
+            (vertices, convex_polygons) = convex_decomposition(vertices)
         if is_airy:
             shapes = ()
         else:
             shapes = tuple(pymunk.Poly(None, vertices=vertices2) for vertices2 in convex_polygons)
-        qg_polygon_item = QGraphicsPolygonItem(QPolygonF(tuple(QPointF(x, y) for (x, y) in vertices)))
+        if is_headless():
+            qg_polygon_item = None
+        else:
+            qg_polygon_item = QGraphicsPolygonItem(QPolygonF(tuple(QPointF(x, y) for (x, y) in vertices)))
         Shaqe.__init__(self, qg_polygon_item, *shapes, **kwargs)
 
     @staticmethod
     def build_from_matrix(matrix, char, block_size, soft=False, **kwargs):
-        def sample_func(point):
-            (x, y) = point
-            return 1 if matrix[int(y)][int(x)] == char else 0
-
-        w = len(matrix[0]) + 2
-        h = len(matrix) + 2
-        char2 = chr(ord(char) + 1)
-        matrix = (w * char2,) + tuple(char2 + line + char2 for line in matrix) + (w * char2,)
-        polygon_shaqes = []
-        march_func = pymunk.autogeometry.march_soft if soft else pymunk.autogeometry.march_hard
-        for s in march_func(pymunk.BB(0, 0, w - 1, h - 1), w, h, 0.5, sample_func):
-            vertices = ((block_size * v.x, block_size * v.y) for v in s)
-            polygon_shaqes.append(PolygonShaqe(vertices, **kwargs))
-        return polygon_shaqes
+        """ returns PolygonShaqe instances covering the cells of matrix containing char (see matrix_to_array
+            for the accepted matrix types); each cell is a square of block_size
+        """
+        # the matrix is surrounded by empty cells, so that all contours are closed
+        samples = np.pad(matrix_to_array(matrix, char), 1)
+        return [PolygonShaqe(vertices, convex_polygons=convex_polygons, **kwargs)
+                for (vertices, convex_polygons) in PolygonShaqe.decompose_matrix(samples, block_size, soft)]
+
+    @staticmethod
+    def decompose_matrix(samples, block_size, soft=False):
+        """ returns a list of (vertices, convex_polygons) for the contours of the given boolean NumPy array, where
+            each cell is a square of block_size; the whole result is kept in the geometry cache, if any
+        """
+        tolerance = CONVEX_DECOMPOSITION_TOLERANCE
+        cache = get_geometry_cache()
+        if cache is not None:
+            key = cache.key("matrix", samples.shape, samples.astype(bool).tobytes(), block_size, soft, tolerance)
+            arrays = cache.load(key)
+            if arrays is not None:
+                polygons = unpack_polygons(arrays["sizes"], arrays["vertices"])
+                convex_polygons = unpack_polygons(arrays["convex_sizes"], arrays["convex_vertices"])
+                result = []
+                start = 0
+                for (vertices, nb_convex_polygons) in zip(polygons, arrays["nb_convex_polygons"].tolist()):
+                    result.append((vertices, convex_polygons[start:start + nb_convex_polygons]))
+                    start += nb_convex_polygons
+                return result
+        result = [convex_decomposition(((block_size * v.x, block_size * v.y) for v in s), tolerance, with_cache=False)
+                  for s in march_matrix(samples, 0.5, soft)]
+        if cache is not None:
+            (sizes, vertices) = pack_polygons([vertices for (vertices, _) in result])
+            (convex_sizes, convex_vertices) = pack_polygons([convex_polygon for (_, convex_polygons) in result
+                                                             for convex_polygon in convex_polygons])
+            nb_convex_polygons = np.array([len(convex_polygons) for (_, convex_polygons) in result], dtype=np.int64)
+            cache.store(key, sizes=sizes, vertices=vertices, convex_sizes=convex_sizes,
+                        convex_vertices=convex_vertices, nb_convex_polygons=nb_convex_polygons)
+        return result
 
     # TODO required for QGraphicsGroup NOK should be put on CompoundShaqe
     # def set_pen(self, pen):
@@ -480,7 +1102,9 @@ class SegmentShaqe(Shaqe):
             ax = cx - w2
             bx = cx + w2
         shapes = (pymunk.Segment(None, a=(ax, cy), b=(bx, cy), radius=h2),) if not is_airy else ()
-        if WIREFRAME_MODE:
+        if is_headless():
+            qg_item = None
+        elif WIREFRAME_MODE:
             qg_item = QGraphicsItemGroup()
             if WIREFRAME_OPAQUE:
                 f = QGraphicsLineItem(ax, cy, bx, cy)
@@ -501,6 +1125,8 @@ class SegmentShaqe(Shaqe):
         Shaqe.__init__(self, qg_item, *shapes, pen=pen, **kwargs)
 
     def set_pen(self, pen):
+        if self.qg_item is None:
+            return
         if WIREFRAME_MODE:
             for child_qg_item in self.qg_item.childItems():
                 if child_qg_item.pen().capStyle() != Qt.RoundCap:
@@ -537,13 +1163,21 @@ class PixmapShaqe(Shaqe):
     """
 
     def __init__(self, pixmap_filename, rounded, is_airy=False, **kwargs):
-        pixmap = QPixmap.fromImageReader(QImageReader(pixmap_filename))
-        size = (width, height) = (pixmap.width(), pixmap.height())
-        qg_item = QGraphicsPixmapItem(pixmap)
-        qg_item.setShapeMode(QGraphicsPixmapItem.BoundingRectShape)
+        image_reader = QImageReader(pixmap_filename)
+        if is_headless():
+            # only the image's header is read
+            qg_item = None
+            image_size = image_reader.size()
+            size = (width, height) = (image_size.width(), image_size.height())
+        else:
+            pixmap = QPixmap.fromImageReader(image_reader)
+            size = (width, height) = (pixmap.width(), pixmap.height())
+            qg_item = QGraphicsPixmapItem(pixmap)
+            qg_item.setShapeMode(QGraphicsPixmapItem.BoundingRectShape)
         w2 = width / 2.0
         h2 = height / 2.0
-        qg_item.setOffset(-w2, -h2)
+        if qg_item is not None:
+            qg_item.setOffset(-w2, -h2)
         if is_airy:
             shapes = ()
         elif rounded:
@@ -572,11 +1206,13 @@ class CompoundShaqe(Shaqe):
     """ CompoundShaqe is a Shaqe subclass for defining a compound item with given child Shaqe instances
     """
 
-    def __init__(self, *child_shaqes, is_airy=False, **kwargs):
+    def __init__(self, *child_shaqes, is_airy=False, group_class=QGraphicsItemGroup, **kwargs):
         # self.child_shaqes = child_shaqes
-        qg_item_group = QGraphicsItemGroup()
-        for child_shaqe in child_shaqes:
-            qg_item_group.addToGroup(child_shaqe.qg_item)
+        qg_item_group = None
+        if not is_headless():
+            qg_item_group = group_class()
+            for child_shaqe in child_shaqes:
+                qg_item_group.addToGroup(child_shaqe.qg_item)
         if is_airy:
             shapes = iter(())
         else:
@@ -613,8 +1249,8 @@ class CompoundItem(Item):
 
 
 class CompoundItemDecomposable(CompoundItem):
-    """ CompoundItemDecomposable is a CompoundItem subclass for defining a compound item with given child Shaqe instances,
-        which can be decomposed into its Item child instances
+    """ CompoundItemDecomposable is a CompoundItem subclass for defining a compound item with given child Shaqe
+        instances, which can be decomposed into its Item child instances
     """
 
     __slots__ = ('child_items',)
@@ -625,36 +1261,1023 @@ class CompoundItemDecomposable(CompoundItem):
         self.child_items = tuple(items)
 
 
+class QGraphicsChunkGroup(QGraphicsItemGroup):
+    """ QGraphicsChunkGroup is a QGraphicsItemGroup subclass for the group of a ChunkedMatrixItem, whose chunks are
+        attached with setParentItem instead of addToGroup: its bounding rect is the one of its active chunks, updated
+        by update_bounding_rect
+    """
+
+    def __init__(self):
+        QGraphicsItemGroup.__init__(self)
+        self.children_rect = QRectF()
+
+    def update_bounding_rect(self):
+        self.prepareGeometryChange()
+        self.children_rect = self.childrenBoundingRect()
+
+    def boundingRect(self):
+        return self.children_rect
+
+
+class ChunkedMatrixItem(Item):
+    """ ChunkedMatrixItem is an Item subclass for defining a kinematic or static item from a huge matrix, like
+        CompoundItem.build_from_matrix; the matrix is split into square chunks of chunk_size cells, which are
+        activated only near the player item or the main view: their shapes are then added to the space and their
+        graphics items to the item's group; the chunks are built at their first activation (using the geometry
+        cache) and they are deactivated when farther than CHUNK_DEACTIVATION_RADIUS
+    """
+
+    __slots__ = ("cells", "block_size", "chunk_size", "soft", "chunk_kwargs", "chunk_geometries",
+                 "active_chunk_shaqes")
+
+    is_streamed = True
+
+    def __init__(self, position, angle, matrix, char, block_size, chunk_size=MATRIX_CHUNK_SIZE, soft=False,
+                 **kwargs):
+        # a dynamic item would require updating its mass and moment at each activation
+        assert kwargs.get("body_type") in (KINEMATIC, STATIC), "ChunkedMatrixItem shall be kinematic or static"
+        self.cells = matrix_to_array(matrix, char)
+        self.block_size = block_size
+        self.chunk_size = chunk_size
+        self.soft = soft
+        self.chunk_kwargs = dict(kwargs)
+        # (vertices, convex_polygons) list per built chunk
+        self.chunk_geometries = {}
+        # PolygonShaqe instances per active chunk
+        self.active_chunk_shaqes = {}
+        Item.__init__(self, position, angle, CompoundShaqe(group_class=QGraphicsChunkGroup, **kwargs), **kwargs)
+
+    @property
+    def nb_chunks(self):
+        (h, w) = self.cells.shape
+        return ceil(h / self.chunk_size) * ceil(w / self.chunk_size)
+
+    def chunk_geometry(self, chunk):
+        geometry = self.chunk_geometries.get(chunk)
+        if geometry is None:
+            (ci, cj) = chunk
+            (i0, j0) = (ci * self.chunk_size, cj * self.chunk_size)
+            chunk_cells = self.cells[i0:i0 + self.chunk_size, j0:j0 + self.chunk_size]
+            if chunk_cells.any():
+                # each chunk is marched separately, with its own empty border: its contours on the chunk's sides
+                # coincide with the ones of the neighbouring chunks, so there is no gap between chunks
+                (dx, dy) = (j0 * self.block_size, i0 * self.block_size)
+                geometry = [(tuple((x + dx, y + dy) for (x, y) in vertices),
+                             tuple(tuple((x + dx, y + dy) for (x, y) in convex_polygon)
+                                   for convex_polygon in convex_polygons))
+                            for (vertices, convex_polygons)
+                            in PolygonShaqe.decompose_matrix(np.pad(chunk_cells, 1), self.block_size, self.soft)]
+            else:
+                geometry = []
+            self.chunk_geometries[chunk] = geometry
+        return geometry
+
+    def chunks_near(self, local_bbs, radius):
+        """ returns the set of chunks intersecting at least one of the given bounding boxes (in item's local
+            coordinates), expanded by radius
+        """
+        (h, w) = self.cells.shape
+        chunk_extent = self.block_size * self.chunk_size
+        # the cell (i, j) lies between (j + 0.5) and (j + 1.5) block sizes, due to the matrix border
+        offset = 0.5 * self.block_size
+        chunks = set()
+        for (left, top, right, bottom) in local_bbs:
+            j_min = max(0, int((left - radius - offset) // chunk_extent))
+            j_max = min(ceil(w / self.chunk_size) - 1, int((right + radius - offset) // chunk_extent))
+            i_min = max(0, int((top - radius - offset) // chunk_extent))
+            i_max = min(ceil(h / self.chunk_size) - 1, int((bottom + radius - offset) // chunk_extent))
+            chunks.update((ci, cj) for ci in range(i_min, i_max + 1) for cj in range(j_min, j_max + 1))
+        return chunks
+
+    def local_bbs_of_interest(self, space):
+        """ returns the bounding boxes, in item's local coordinates, of the player item and of the main view
+        """
+        world_points = []
+        if space.player_item is not None:
+            world_points.append((space.player_item.position,))
+        if space.main_view is not None:
+            view_rect = space.main_view.mapToScene(space.main_view.viewport().rect()).boundingRect()
+            world_points.append(((view_rect.left(), view_rect.top()), (view_rect.right(), view_rect.top()),
+                                 (view_rect.right(), view_rect.bottom()), (view_rect.left(), view_rect.bottom())))
+        local_bbs = []
+        for points in world_points:
+            local_points = tuple(self.world_to_local(point) for point in points)
+            xs = tuple(point.x for point in local_points)
+            ys = tuple(point.y for point in local_points)
+            local_bbs.append((min(xs), min(ys), max(xs), max(ys)))
+        return local_bbs
+
+    def update_streaming(self, space):
+        """ activates the chunks near the player item and the main view and deactivates the far ones
+        """
+        local_bbs = self.local_bbs_of_interest(space)
+        chunks_to_keep = self.chunks_near(local_bbs, CHUNK_DEACTIVATION_RADIUS)
+        chunks_to_activate = self.chunks_near(local_bbs, CHUNK_ACTIVATION_RADIUS)
+        changed = False
+        for chunk in tuple(self.active_chunk_shaqes):
+            if chunk not in chunks_to_keep:
+                self.deactivate_chunk(space, chunk)
+                changed = True
+        for chunk in chunks_to_activate:
+            if chunk not in self.active_chunk_shaqes:
+                self.activate_chunk(space, chunk)
+                changed = True
+        if changed:
+            self.child_shapes = tuple(shape for shaqes in self.active_chunk_shaqes.values()
+                                      for shaqe in shaqes for shape in shaqe.shapes)
+            if self.qg_item is not None:
+                self.qg_item.update_bounding_rect()
+
+    def activate_chunk(self, space, chunk):
+        shaqes = [PolygonShaqe(vertices, convex_polygons=convex_polygons, **self.chunk_kwargs)
+                  for (vertices, convex_polygons) in self.chunk_geometry(chunk)]
+        collision_type = space.collision_registry.collision_type(self.__class__)
+        for shaqe in shaqes:
+            for shape in shaqe.shapes:
+                shape.body = self.body
+                shape.collision_type = collision_type
+                space.add(shape)
+            # unlike addToGroup, setParentItem keeps the local coordinates, whatever the group's transform
+            if shaqe.qg_item is not None:
+                shaqe.qg_item.setParentItem(self.qg_item)
+        self.active_chunk_shaqes[chunk] = shaqes
+
+    def deactivate_chunk(self, space, chunk):
+        for shaqe in self.active_chunk_shaqes.pop(chunk):
+            for shape in shaqe.shapes:
+                space.remove(shape)
+            if shaqe.qg_item is not None:
+                shaqe.qg_item.setParentItem(None)
+                qg_scene = shaqe.qg_item.scene()
+                if qg_scene is not None:
+                    qg_scene.removeItem(shaqe.qg_item)
+
+
+def qpolygonf_from_array(points):
+    """ returns a QPolygonF built from the given (n, 2) NumPy array, by copying the coordinates
+        directly into the polygon's memory
+    """
+    n = len(points)
+    polygon = QPolygonF()
+    polygon.fill(QPointF(), n)
+    if n > 0:
+        buffer = polygon.data()
+        buffer.setsize(n * 16)
+        np.frombuffer(buffer, dtype=np.float64).reshape(n, 2)[:] = points
+    return polygon
+
+
+class LodLayer(QGraphicsItem):
+    """ LodLayer paints as single points, with one drawPoints call per color, the items too small on screen to be
+        drawn in detail (see MQSpace.update_lod); the graphics items of these are hidden meanwhile
+    """
+
+    def __init__(self, bounding_rect):
+        QGraphicsItem.__init__(self)
+        self.bounding_rect = bounding_rect
+        self.items_by_rgba = {}
+        self.item_set = set()
+        self.pen = QPen()
+        self.pen.setCosmetic(True)
+        self.pen.setWidthF(LOD_POINT_SIZE)
+
+    @staticmethod
+    def rgba_of(qg_item):
+        brush = qg_item.brush() if hasattr(qg_item, "brush") else None
+        if brush is not None and brush.style() != Qt.NoBrush:
+            return brush.color().rgba()
+        if hasattr(qg_item, "pen") and qg_item.pen().style() != Qt.NoPen:
+            return qg_item.pen().color().rgba()
+        return QColor(Qt.lightGray).rgba()
+
+    def set_items(self, items):
+        """ replaces the items drawn as points by the given ones
+        """
+        new_item_set = set(items)
+        for item in self.item_set - new_item_set:
+            item.qg_item.setVisible(True)
+        for item in new_item_set - self.item_set:
+            item.qg_item.setVisible(False)
+        self.item_set = new_item_set
+        self.items_by_rgba = {}
+        for item in items:
+            self.items_by_rgba.setdefault(LodLayer.rgba_of(item.qg_item), []).append(item)
+        self.update()
+
+    def discard(self, item):
+        if item in self.item_set:
+            item.qg_item.setVisible(True)
+            self.item_set.discard(item)
+            for items in self.items_by_rgba.values():
+                if item in items:
+                    items.remove(item)
+
+    def boundingRect(self):
+        return self.bounding_rect
+
+    def paint(self, painter, option, widget=None):
+        pen = self.pen
+        for (rgba, items) in self.items_by_rgba.items():
+            if items:
+                pen.setColor(QColor.fromRgba(rgba))
+                painter.setPen(pen)
+                painter.drawPoints(QPolygonF([item.qg_item.pos() for item in items]))
+
+
+class StaticTileCache:
+    """ StaticTileCache paints the given static layer from pixmap tiles, each one rendered once, at the first paint
+        showing it; the tiles are keyed by zoom bucket and by position on the grid of this bucket; a tile without
+        any item is stored as None
+    """
+
+    __slots__ = ("static_layer", "tiles", "capacity", "nb_renders")
+
+    def __init__(self, static_layer, capacity=STATIC_TILE_CACHE_SIZE):
+        self.static_layer = static_layer
+        self.tiles = OrderedDict()
+        self.capacity = capacity
+        self.nb_renders = 0
+
+    @staticmethod
+    def tile_scene_size(bucket):
+        return STATIC_TILE_SIZE / 2 ** (bucket / 2)
+
+    def draw(self, painter, rect):
+        """ draws, with the given painter in scene coordinates, the tiles intersecting the given scene rect
+        """
+        transform = painter.worldTransform()
+        scale = sqrt(abs(transform.determinant())) * painter.device().devicePixelRatioF()
+        if scale <= 0.0:
+            return
+        bucket = round(2 * log2(scale))
+        size = StaticTileCache.tile_scene_size(bucket)
+        tiles = self.tiles
+        for ix in range(floor(rect.left() / size), floor(rect.right() / size) + 1):
+            for iy in range(floor(rect.top() / size), floor(rect.bottom() / size) + 1):
+                key = (bucket, ix, iy)
+                if key in tiles:
+                    tiles.move_to_end(key)
+                    pixmap = tiles[key]
+                else:
+                    pixmap = self.render_tile(QRectF(ix * size, iy * size, size, size))
+                    tiles[key] = pixmap
+                    if len(tiles) > self.capacity:
+                        tiles.popitem(last=False)
+                if pixmap is not None:
+                    painter.drawPixmap(QRectF(ix * size, iy * size, size, size), pixmap, QRectF(pixmap.rect()))
+
+    def render_tile(self, source):
+        if not self.static_layer.items(source):
+            return None
+        self.nb_renders += 1
+        pixmap = QPixmap(STATIC_TILE_SIZE, STATIC_TILE_SIZE)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing, ANTIALIASING)
+        self.static_layer.render(painter, QRectF(pixmap.rect()), source, Qt.IgnoreAspectRatio)
+        painter.end()
+        return pixmap
+
+    def invalidate(self, rect=None):
+        """ drops the tiles intersecting the given scene rect, all of them if rect is None
+        """
+        if rect is None:
+            self.tiles.clear()
+            return
+        for key in tuple(self.tiles):
+            (bucket, ix, iy) = key
+            size = StaticTileCache.tile_scene_size(bucket)
+            if rect.intersects(QRectF(ix * size, iy * size, size, size)):
+                del self.tiles[key]
+
+
+class ParticleSystem(QGraphicsItem):
+    """ ParticleSystem is a QGraphicsItem subclass handling a set of purely visual particles, without any pymunk body;
+        positions, velocities, ages, lifetimes and colors are stored in NumPy arrays, they are integrated in one
+        vectorized step and they are painted with one drawPoints call per color; optionally, particles bounce on
+        the non-dynamic shapes of the space, found by a single bounding box query on the whole particle cloud
+    """
+
+    # number of opacity levels used for fading particles
+    FADING_LEVELS = 8
+
+    def __init__(self, capacity, radius, color, with_fading=True, collides=False, elasticity=0.5):
+        QGraphicsItem.__init__(self)
+        self.capacity = capacity
+        self.radius = radius
+        self.color = QColor(color)
+        self.with_fading = with_fading
+        self.collides = collides
+        self.elasticity = elasticity
+        self.positions = np.empty((capacity, 2))
+        self.velocities = np.empty((capacity, 2))
+        self.ages = np.empty(capacity)
+        self.lifetimes = np.empty(capacity)
+        # ARGB values, as returned by QColor.rgba()
+        self.colors = np.empty(capacity, dtype=np.uint32)
+        self.count = 0
+        self.bounding_rect = QRectF()
+        self.pen = QPen()
+        self.pen.setWidthF(2.0 * radius)
+        self.pen.setCapStyle(Qt.RoundCap)
+
+    def emit(self, position, velocity, lifetime, color=None):
+        """ adds one particle; it is ignored if the particle system is full
+        """
+        i = self.count
+        if i < self.capacity:
+            self.positions[i] = position
+            self.velocities[i] = velocity
+            self.ages[i] = 0.0
+            self.lifetimes[i] = lifetime
+            self.colors[i] = (self.color if color is None else QColor(color)).rgba()
+            self.count = i + 1
+
+    def emit_burst(self, position, velocity, nb_particles, speed_range, lifetime, offset=0.0, color=None):
+        """ adds particles going away from the given position in random directions, with random speeds
+            in speed_range (relative to the given velocity); exceeding particles are ignored
+        """
+        i = self.count
+        n = min(nb_particles, self.capacity - i)
+        if n <= 0:
+            return
+        angles = np.random.uniform(0.0, 2.0 * np.pi, n)
+        directions = np.column_stack((np.cos(angles), np.sin(angles)))
+        speeds = np.random.uniform(*speed_range, n)
+        self.positions[i:i + n] = np.add(position, offset * directions)
+        self.velocities[i:i + n] = np.add(velocity, speeds[:, None] * directions)
+        self.ages[i:i + n] = 0.0
+        self.lifetimes[i:i + n] = lifetime
+        self.colors[i:i + n] = (self.color if color is None else QColor(color)).rgba()
+        self.count = i + n
+
+    def step(self, dt, space):
+        n = self.count
+        if n == 0:
+            return
+        self.ages[:n] += dt
+        alive = self.ages[:n] < self.lifetimes[:n]
+        if not alive.all():
+            n = int(alive.sum())
+            for array in (self.positions, self.velocities, self.ages, self.lifetimes, self.colors):
+                array[:n] = array[:self.count][alive]
+            self.count = n
+        if n > 0:
+            velocities = self.velocities[:n]
+            velocities *= space.damping ** dt
+            velocities += np.multiply(space.gravity, dt)
+            self.positions[:n] += velocities * dt
+            if self.collides:
+                self.collide(space)
+            (x0, y0) = self.positions[:n].min(axis=0) - self.radius
+            (x1, y1) = self.positions[:n].max(axis=0) + self.radius
+            bounding_rect = QRectF(x0, y0, x1 - x0, y1 - y0)
+        else:
+            bounding_rect = QRectF()
+        if bounding_rect != self.bounding_rect:
+            self.prepareGeometryChange()
+            self.bounding_rect = bounding_rect
+        self.update()
+
+    def collide(self, space):
+        n = self.count
+        positions = self.positions[:n]
+        (x0, y0) = positions.min(axis=0) - self.radius
+        (x1, y1) = positions.max(axis=0) + self.radius
+        shapes = [shape for shape in space.bb_query(pymunk.BB(x0, y0, x1, y1), pymunk.ShapeFilter())
+                        if shape.body.body_type != DYNAMIC and not shape.sensor]
+        if len(shapes) == 0:
+            return
+        # keep the (particle, shape) pairs where the particle is inside the shape's bounding box
+        bbs = np.array(tuple((bb.left, bb.bottom, bb.right, bb.top) for bb in (shape.bb for shape in shapes)))
+        (xs, ys) = (positions[:, 0, None], positions[:, 1, None])
+        (particle_idxs, shape_idxs) = np.nonzero((xs >= bbs[:, 0] - self.radius) & (xs <= bbs[:, 2] + self.radius)
+                                               & (ys >= bbs[:, 1] - self.radius) & (ys <= bbs[:, 3] + self.radius))
+        for (i, j) in zip(particle_idxs.tolist(), shape_idxs.tolist()):
+            info = shapes[j].point_query(tuple(positions[i]))
+            if info.distance < self.radius:
+                (nx, ny) = info.gradient
+                (px, py) = info.point
+                positions[i] = (px + nx * self.radius, py + ny * self.radius)
+                (vx, vy) = self.velocities[i]
+                vn = vx * nx + vy * ny
+                if vn < 0.0:
+                    k = (1.0 + self.elasticity) * vn
+                    self.velocities[i] = (vx - k * nx, vy - k * ny)
+
+    def boundingRect(self):
+        return self.bounding_rect
+
+    def paint(self, painter, option, widget):
+        n = self.count
+        if n == 0:
+            return
+        colors = self.colors[:n]
+        if self.with_fading:
+            levels = np.ceil((1.0 - self.ages[:n] / self.lifetimes[:n]) * ParticleSystem.FADING_LEVELS)
+            alphas = (colors >> 24) * levels.astype(np.uint32) // ParticleSystem.FADING_LEVELS
+            colors = (colors & 0x00FFFFFF) | (alphas << 24)
+        unique_colors = np.unique(colors)
+        pen = self.pen
+        for color in unique_colors.tolist():
+            pen.setColor(QColor.fromRgba(color))
+            painter.setPen(pen)
+            points = self.positions[:n] if len(unique_colors) == 1 else self.positions[:n][colors == color]
+            painter.drawPoints(qpolygonf_from_array(points))
+
+
+class TrailItem(QGraphicsItem):
+    """ TrailItem paints the last positions of an item as a polyline; the positions are kept in a NumPy ring buffer
+        of fixed capacity, where the oldest ones are overwritten; with fading, the polyline is drawn in
+        FADING_LEVELS parts, of decreasing opacity from the newest positions to the oldest ones
+    """
+
+    FADING_LEVELS = 8
+
+    def __init__(self, item, pen, capacity=TRAIL_CAPACITY, with_fading=TRAIL_FADING):
+        QGraphicsItem.__init__(self)
+        self.item = item
+        self.pen = QPen(pen)
+        self.capacity = capacity
+        self.with_fading = with_fading
+        self.positions = np.empty((capacity, 2))
+        # index of the next position to write
+        self.head = 0
+        self.count = 0
+        self.nb_frames = 0
+        self.bounding_rect = QRectF()
+        # (alpha, polygon) pairs to draw, built at the first paint after a change
+        self.polylines = None
+        self.setZValue(-1)
+
+    def sample(self):
+        """ adds the current position of the item to the trail, once every TRACE_LENGTH calls, if it has moved
+        """
+        self.nb_frames += 1
+        if (self.nb_frames - 1) % TRACE_LENGTH != 0:
+            return
+        (x, y) = self.item.position
+        if self.count > 0 and tuple(self.positions[self.head - 1]) == (x, y):
+            return
+        self.positions[self.head] = (x, y)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        positions = self.positions[:self.count]
+        (x0, y0) = positions.min(axis=0)
+        (x1, y1) = positions.max(axis=0)
+        bounding_rect = QRectF(x0, y0, x1 - x0, y1 - y0)
+        if bounding_rect != self.bounding_rect:
+            self.prepareGeometryChange()
+            self.bounding_rect = bounding_rect
+        self.polylines = None
+        self.update()
+
+    def ordered_positions(self):
+        """ returns the positions of the trail, from the oldest to the newest
+        """
+        if self.count < self.capacity:
+            return self.positions[:self.count]
+        return np.concatenate((self.positions[self.head:], self.positions[:self.head]))
+
+    def boundingRect(self):
+        return self.bounding_rect
+
+    def paint(self, painter, option, widget):
+        if self.count < 2:
+            return
+        if self.polylines is None:
+            positions = self.ordered_positions()
+            if self.with_fading:
+                nb_levels = min(TrailItem.FADING_LEVELS, self.count - 1)
+                bounds = np.linspace(0, self.count - 1, nb_levels + 1).round().astype(int).tolist()
+                # consecutive parts share their end point, so that the polyline is not broken
+                self.polylines = [((level + 1) / nb_levels, qpolygonf_from_array(positions[i0:i1 + 1]))
+                                  for (level, (i0, i1)) in enumerate(zip(bounds, bounds[1:]))]
+            else:
+                self.polylines = [(1.0, qpolygonf_from_array(positions))]
+        pen = self.pen
+        color = QColor(pen.color())
+        alpha = color.alphaF()
+        for (level_alpha, polyline) in self.polylines:
+            color.setAlphaF(alpha * level_alpha)
+            pen.setColor(color)
+            painter.setPen(pen)
+            painter.drawPolyline(polyline)
+        color.setAlphaF(alpha)
+        pen.setColor(color)
+
+
+def _spread_bits(v):
+    """ returns the given array of 16-bit integers with a zero bit inserted between each bit
+        (used for building Morton codes)
+    """
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
+
+
+class BarnesHutTree:
+    """ BarnesHutTree is a quadtree allowing to compute the N-body gravitational accelerations in O(n log n);
+        the tree is stored in NumPy arrays, level by level: the bodies are sorted by the Morton code of their
+        position and the nodes of a level are the runs of bodies sharing the same code prefix; since bodies
+        move little between two steps, the Morton order of the previous step is reused as starting order,
+        so that the stable sort of the new codes is almost linear;
+        the opening angle sets the trade-off between accuracy and cost: a node of width w seen at distance d
+        is taken as a point mass if w / d < opening angle (0 gives the exact all-pairs sum)
+    """
+
+    MAX_DEPTH = 16
+
+    __slots__ = ("rank_by_item",)
+
+    def __init__(self):
+        self.rank_by_item = {}
+
+    def sort_items(self, items):
+        """ sorts in place the given items according to the Morton order of the previous step
+        """
+        rank_by_item = self.rank_by_item
+        n = len(rank_by_item)
+        items.sort(key=lambda item: rank_by_item.get(item, n))
+
+    def accelerations(self, items, positions, masses, gravitational_constant, opening_angle, softening):
+        """ returns the array of accelerations exerted on each item by all other items;
+            items shall have been sorted by sort_items and positions, masses shall follow the same order
+        """
+        n = len(items)
+        depth = BarnesHutTree.MAX_DEPTH
+        p_min = positions.min(axis=0)
+        size = (positions.max(axis=0) - p_min).max()
+        if size <= 0.0:
+            size = 1.0
+        cells = np.clip(((positions - p_min) * ((1 << depth) / size)).astype(np.int64), 0, (1 << depth) - 1)
+        codes = _spread_bits(cells[:, 0]) | (_spread_bits(cells[:, 1]) << 1)
+        order = np.argsort(codes, kind="stable")
+        self.rank_by_item = {items[idx]: rank for (rank, idx) in enumerate(order.tolist())}
+        codes = codes[order]
+        positions = positions[order]
+        masses = masses[order]
+        # build the levels, from the root down to the level where all the nodes contain one body
+        levels = []
+        for level in range(depth + 1):
+            prefixes = codes >> (2 * (depth - level))
+            starts = np.flatnonzero(np.r_[True, prefixes[1:] != prefixes[:-1]])
+            counts = np.diff(np.r_[starts, n])
+            node_masses = np.add.reduceat(masses, starts)
+            coms = np.add.reduceat(positions * masses[:, None], starts) / node_masses[:, None]
+            levels.append((prefixes[starts], starts, counts, node_masses, coms))
+            if counts.max() == 1:
+                break
+        # traverse the tree for all bodies at once, as a frontier of (body, node) pairs
+        theta2 = opening_angle ** 2
+        eps2 = softening ** 2
+        accelerations = np.zeros((n, 2))
+        bodies = np.arange(n)
+        nodes = np.zeros(n, dtype=np.int64)
+        last_level = len(levels) - 1
+        for (level, (prefixes, starts, counts, node_masses, coms)) in enumerate(levels):
+            width = size / (1 << level)
+            node_starts = starts[nodes]
+            node_counts = counts[nodes]
+            contains = (node_starts <= bodies) & (bodies < node_starts + node_counts)
+            d = coms[nodes] - positions[bodies]
+            d2 = np.einsum("ij,ij->i", d, d)
+            m = node_masses[nodes]
+            if level == last_level:
+                # bodies sharing their deepest cell with other bodies are attracted by the others' center of mass
+                shared = contains & (node_counts > 1)
+                mb = masses[bodies[shared]]
+                mo = m[shared] - mb
+                pb = positions[bodies[shared]]
+                d[shared] = (coms[nodes[shared]] * m[shared, None] - pb * mb[:, None]) / mo[:, None] - pb
+                d2[shared] = np.einsum("ij,ij->i", d[shared], d[shared])
+                m[shared] = mo
+                accepted = ~contains | shared
+            else:
+                accepted = ~contains & ((node_counts == 1) | (width * width < theta2 * d2))
+            b = bodies[accepted]
+            d = d[accepted]
+            w = gravitational_constant * m[accepted] / (d2[accepted] + eps2) ** 1.5
+            accelerations[:, 0] += np.bincount(b, weights=w * d[:, 0], minlength=n)
+            accelerations[:, 1] += np.bincount(b, weights=w * d[:, 1], minlength=n)
+            if level == last_level:
+                break
+            # open the other nodes, except the leaves containing the body itself
+            opened = ~accepted & (node_counts > 1)
+            bodies = bodies[opened]
+            nodes = nodes[opened]
+            if len(bodies) == 0:
+                break
+            parents = levels[level + 1][0] >> 2
+            first_children = np.searchsorted(parents, prefixes)
+            nb_children = np.searchsorted(parents, prefixes, side="right") - first_children
+            repeats = nb_children[nodes]
+            offsets = np.arange(repeats.sum()) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+            bodies = np.repeat(bodies, repeats)
+            nodes = np.repeat(first_children[nodes], repeats) + offsets
+        result = np.empty_like(accelerations)
+        result[order] = accelerations
+        return result
+
+
+class GravityField:
+    """ GravityField computes the gravity exerted on all dynamic items by
+        - any number of attractive items, each with its own force and radius (central gravity),
+        - optionally, all the dynamic items between themselves (N-body gravity, using a BarnesHutTree);
+        before each pymunk step, the items' positions and masses are gathered in NumPy arrays, the attraction
+        is computed for all items in vectorized passes and it is fed back to the items as forces
+    """
+
+    __slots__ = ("attractors", "gravitational_constant", "opening_angle", "softening", "barnes_hut_tree")
+
+    def __init__(self):
+        self.attractors = []
+        self.gravitational_constant = None
+        self.opening_angle = None
+        self.softening = None
+        self.barnes_hut_tree = None
+
+    def add_attractor(self, attractive_item, force, radius):
+        self.attractors.append((attractive_item, force, radius))
+
+    def remove_attractor(self, attractive_item):
+        self.attractors = [attractor for attractor in self.attractors if attractor[0] is not attractive_item]
+
+    def set_n_body(self, gravitational_constant, opening_angle=0.5, softening=1.0):
+        self.gravitational_constant = gravitational_constant
+        self.opening_angle = opening_angle
+        self.softening = softening
+        self.barnes_hut_tree = None if gravitational_constant is None else BarnesHutTree()
+
+    def apply(self, bodies):
+        if len(self.attractors) == 0 and self.barnes_hut_tree is None:
+            return
+        items = [item for item in bodies if item.body_type == DYNAMIC and not item.is_sleeping]
+        n = len(items)
+        if n == 0:
+            return
+        if self.barnes_hut_tree is not None:
+            self.barnes_hut_tree.sort_items(items)
+        positions = np.fromiter((c for item in items for c in item.position), dtype=float, count=2 * n).reshape(n, 2)
+        masses = np.fromiter((item.mass for item in items), dtype=float, count=n)
+        if self.barnes_hut_tree is not None and n > 1:
+            accelerations = self.barnes_hut_tree.accelerations(items, positions, masses, self.gravitational_constant,
+                                                                self.opening_angle, self.softening)
+        else:
+            accelerations = np.zeros((n, 2))
+        for (attractive_item, force, radius) in self.attractors:
+            d = np.subtract(attractive_item.position, positions)
+            d2 = np.einsum("ij,ij->i", d, d)
+            d3 = d2 * np.sqrt(d2)
+            # Newton's law of gravitation; shell theorem: if the body is inside the sphere (d < radius),
+            # then only the inner sphere's mass shall be considered
+            with np.errstate(divide="ignore", invalid="ignore"):
+                f = np.where(d3 > 0.0, force / np.maximum(d3, radius ** 3), 0.0)
+            try:
+                # the attractive item is not attracted by itself
+                f[items.index(attractive_item)] = 0.0
+            except ValueError:
+                pass
+            accelerations += d * f[:, None]
+        forces = accelerations * masses[:, None]
+        for (item, (fx, fy)) in zip(items, forces.tolist()):
+            item.force += (fx, fy)
+
+
+# record of a collision event, as given to the handlers registered by MQSpace.on_collision_event
+COLLISION_EVENT_DTYPE = np.dtype([("contact_point", np.float64, (2,)),
+                                  ("normal_impulse", np.float64),
+                                  ("relative_speed", np.float64)])
+
+
+class CollisionEventBus:
+    """ CollisionEventBus records the collisions starting during the physics step, in preallocated buffers,
+        then dispatches them after the step, in one batch per handler; the Python work done inside the solver is
+        then minimal and the handlers may freely modify the space; the collisions of a same pair of items in a
+        step are merged in one event (their normal impulses being summed), the events exceeding the capacity
+        are dropped
+    """
+
+    __slots__ = ("handlers", "handler_idx_by_collision_types", "items_a", "items_b", "events", "handler_indices",
+                 "event_idx_by_key", "nb_events", "nb_dropped_events")
+
+    def __init__(self, capacity=COLLISION_EVENT_CAPACITY):
+        self.handlers = []
+        self.handler_idx_by_collision_types = {}
+        self.items_a = [None] * capacity
+        self.items_b = [None] * capacity
+        self.events = np.zeros(capacity, dtype=COLLISION_EVENT_DTYPE)
+        self.handler_indices = np.zeros(capacity, dtype=np.int32)
+        self.event_idx_by_key = {}
+        self.nb_events = 0
+        self.nb_dropped_events = 0
+
+    def register(self, space, collision_type_a, collision_type_b, handler):
+        """ see MQSpace.on_collision_event
+        """
+        collision_types = (collision_type_a, collision_type_b)
+        handler_idx = self.handler_idx_by_collision_types.get(collision_types)
+        if handler_idx is not None:
+            self.handlers[handler_idx] = handler
+            return
+        handler_idx = len(self.handlers)
+        self.handlers.append(handler)
+        self.handler_idx_by_collision_types[collision_types] = handler_idx
+        space.on_collision(collision_type_a, collision_type_b, begin=self.begin, post_solve=self.post_solve,
+                           data=handler_idx)
+
+    def begin(self, arbiter, space, handler_idx):
+        (item_a, item_b) = arbiter.bodies
+        key = (item_a, item_b, handler_idx)
+        if key in self.event_idx_by_key:
+            return
+        event_idx = self.nb_events
+        if event_idx == len(self.items_a):
+            self.nb_dropped_events += 1
+            return
+        contact_point = arbiter.contact_point_set.points[0]
+        relative_speed = (item_b.velocity_at_world_point(contact_point.point_b)
+                          - item_a.velocity_at_world_point(contact_point.point_a)).length
+        self.items_a[event_idx] = item_a
+        self.items_b[event_idx] = item_b
+        self.events[event_idx] = (contact_point.point_a, 0.0, relative_speed)
+        self.handler_indices[event_idx] = handler_idx
+        self.event_idx_by_key[key] = event_idx
+        self.nb_events = event_idx + 1
+
+    def post_solve(self, arbiter, space, handler_idx):
+        if arbiter.is_first_contact:
+            (item_a, item_b) = arbiter.bodies
+            event_idx = self.event_idx_by_key.get((item_a, item_b, handler_idx))
+            if event_idx is not None:
+                self.events["normal_impulse"][event_idx] += arbiter.total_impulse.length
+
+    def dispatch(self):
+        """ calls the handlers with the events recorded since the previous call
+        """
+        nb_events = self.nb_events
+        if nb_events == 0:
+            return
+        self.nb_events = 0
+        self.event_idx_by_key.clear()
+        items_a = self.items_a[:nb_events]
+        items_b = self.items_b[:nb_events]
+        self.items_a[:nb_events] = self.items_b[:nb_events] = [None] * nb_events
+        handler_indices = self.handler_indices[:nb_events]
+        for (handler_idx, handler) in enumerate(self.handlers):
+            event_indices = np.flatnonzero(handler_indices == handler_idx)
+            if len(event_indices) > 0:
+                handler([items_a[event_idx] for event_idx in event_indices],
+                        [items_b[event_idx] for event_idx in event_indices],
+                        self.events[event_indices])
+
+
+class CollisionRegistry:
+    """ CollisionRegistry assigns small dense collision types to the item classes, or to named groups of items
+        (e.g. "liquid"), and registers the pymunk collision handlers of each of these once, at first need; these
+        handlers dispatch the collisions to the callbacks of the colliding items
+    """
+
+    __slots__ = ("collision_type_by_key", "registered_keys")
+
+    def __init__(self):
+        self.collision_type_by_key = {}
+        self.registered_keys = set()
+
+    def collision_type(self, key):
+        collision_type = self.collision_type_by_key.get(key)
+        if collision_type is None:
+            # 0 is the default collision type of pymunk shapes
+            collision_type = len(self.collision_type_by_key) + 1
+            self.collision_type_by_key[key] = collision_type
+        return collision_type
+
+    def register_collision_function(self, space, item_class):
+        """ makes the collision events of the items of the given class dispatched to their collision_function
+        """
+        if item_class not in self.registered_keys:
+            self.registered_keys.add(item_class)
+            space.on_collision_event(self.collision_type(item_class), None,
+                                     CollisionRegistry.dispatch_to_collision_functions)
+
+    def register_liquid(self, space):
+        """ makes the collisions with the liquid items dispatched to their liquid_callbacks
+        """
+        if "liquid" not in self.registered_keys:
+            self.registered_keys.add("liquid")
+            space.on_collision(self.collision_type("liquid"), None, begin=CollisionRegistry.begin_liquid,
+                               separate=CollisionRegistry.separate_liquid)
+
+    @staticmethod
+    def dispatch_to_collision_functions(items_a, items_b, events):
+        item_a = items_a[0]
+        if all(item is item_a for item in items_a):
+            item_a.collision_function(items_a, items_b, events)
+            return
+        event_indices_by_item = {}
+        for (event_idx, item) in enumerate(items_a):
+            event_indices_by_item.setdefault(item, []).append(event_idx)
+        for (item, event_indices) in event_indices_by_item.items():
+            item.collision_function([items_a[event_idx] for event_idx in event_indices],
+                                    [items_b[event_idx] for event_idx in event_indices],
+                                    events[event_indices])
+
+    @staticmethod
+    def liquid_and_other_bodies(arbiter, space):
+        """ returns (liquid_item, body), the bodies of the arbiter's liquid shape and of its other shape, since
+            pymunk does not guarantee the order of the arbiter's shapes
+        """
+        (shape_a, shape_b) = arbiter.shapes
+        if shape_a.collision_type == space.collision_registry.collision_type("liquid"):
+            return (shape_a.body, shape_b.body)
+        return (shape_b.body, shape_a.body)
+
+    @staticmethod
+    def begin_liquid(arbiter, space, data):
+        (liquid_item, body) = CollisionRegistry.liquid_and_other_bodies(arbiter, space)
+        if liquid_item is not None and liquid_item.liquid_callbacks is not None:
+            liquid_item.liquid_callbacks[0](arbiter, body)
+
+    @staticmethod
+    def separate_liquid(arbiter, space, data):
+        (liquid_item, body) = CollisionRegistry.liquid_and_other_bodies(arbiter, space)
+        # the shape has no body if the separation comes from the liquid item's removal
+        if liquid_item is not None and liquid_item.liquid_callbacks is not None:
+            liquid_item.liquid_callbacks[1](arbiter, body)
+
+
+class StartupProfiler:
+    """ StartupProfiler records the durations of the startup phases, from munqy import to first frame painted
+    """
+
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.last_time = start_time
+        self.phase_durations = []
+
+    def mark(self, phase):
+        """ records the end of the given phase, started at the end of the previous one
+        """
+        now = perf_counter()
+        self.phase_durations.append((phase, now - self.last_time))
+        self.last_time = now
+
+    def report(self):
+        lines = [f"{phase:<20} {1e3 * duration:8.1f} ms" for (phase, duration) in self.phase_durations]
+        lines.append(f"{'time to first frame':<20} {1e3 * (self.last_time - self.start_time):8.1f} ms")
+        return "\n".join(lines)
+
+
+class FrameProfiler:
+    """ FrameProfiler measures the wall-clock duration of the phases of each frame, by successive laps;
+        the durations of the last frames are kept in a circular NumPy array, from which rolling percentiles
+        are computed; frames whose total duration exceeds the frame budget are counted as overruns
+    """
+
+    PHASES = ("transient", "kinematic", "removal", "gravity", "physics", "collisions", "particles",
+              "trace", "inputs", "streaming", "sync", "index", "lookup", "user", "views", "sound", "paint")
+
+    def __init__(self, frame_budget, window_size=PROFILER_WINDOW_SIZE):
+        self.frame_budget = frame_budget
+        self.phase_idx_by_name = {phase: phase_idx for (phase_idx, phase) in enumerate(FrameProfiler.PHASES)}
+        # durations (in sec) of the last frames, per phase; the last column is the frame's total
+        self.durations = np.zeros((window_size, len(FrameProfiler.PHASES) + 1))
+        self.current_durations = [0.0] * len(FrameProfiler.PHASES)
+        self.totals = np.zeros(len(FrameProfiler.PHASES) + 1)
+        self.lap_time = None
+        self.nb_frames = 0
+        self.nb_overruns = 0
+
+    def reset(self):
+        self.durations[:] = 0.0
+        self.totals[:] = 0.0
+        self.nb_frames = 0
+        self.nb_overruns = 0
+
+    def start_frame(self):
+        self.lap_time = perf_counter()
+
+    def lap(self, phase):
+        """ adds the time elapsed since the previous lap (or frame start) to the given phase
+        """
+        now = perf_counter()
+        self.current_durations[self.phase_idx_by_name[phase]] += now - self.lap_time
+        self.lap_time = now
+
+    def add(self, phase, duration):
+        """ adds a duration measured outside of the laps (e.g. view painting) to the given phase
+        """
+        self.current_durations[self.phase_idx_by_name[phase]] += duration
+
+    def end_frame(self):
+        current_durations = self.current_durations
+        frame_duration = sum(current_durations)
+        row = self.durations[self.nb_frames % len(self.durations)]
+        row[:-1] = current_durations
+        row[-1] = frame_duration
+        self.totals += row
+        self.nb_frames += 1
+        if frame_duration > self.frame_budget:
+            self.nb_overruns += 1
+        self.current_durations = [0.0] * len(current_durations)
+
+    def percentiles(self, percents=(50, 95, 99)):
+        """ returns a dictionary giving, for each phase and for "frame", the durations (in sec)
+            at the given percents, over the last frames
+        """
+        nb_rows = min(self.nb_frames, len(self.durations))
+        if nb_rows == 0:
+            return {}
+        values = np.percentile(self.durations[:nb_rows], percents, axis=0)
+        return {phase: tuple(values[:, phase_idx])
+                for (phase_idx, phase) in enumerate(FrameProfiler.PHASES + ("frame",))}
+
+    def recent_median(self, phase, nb_frames):
+        """ returns the median duration (in sec) of the given phase over the last nb_frames frames
+        """
+        nb_rows = min(self.nb_frames, len(self.durations), nb_frames)
+        if nb_rows == 0:
+            return 0.0
+        row_indices = np.arange(self.nb_frames - nb_rows, self.nb_frames) % len(self.durations)
+        return float(np.median(self.durations[row_indices, self.phase_idx_by_name[phase]]))
+
+    def nb_recent_overruns(self):
+        nb_rows = min(self.nb_frames, len(self.durations))
+        return int(np.count_nonzero(self.durations[:nb_rows, -1] > self.frame_budget))
+
+    def report(self, counts=None):
+        """ returns a multi-line text with the percentiles of each phase (in ms) and the overruns
+        """
+        lines = [f"{'phase':<10} {'p50':>6} {'p95':>6} {'p99':>6}"]
+        for (phase, (p50, p95, p99)) in self.percentiles().items():
+            lines.append(f"{phase:<10} {p50 * 1e3:6.2f} {p95 * 1e3:6.2f} {p99 * 1e3:6.2f}")
+        nb_rows = min(self.nb_frames, len(self.durations))
+        lines.append(f"overruns   {self.nb_recent_overruns()}/{nb_rows} (> {self.frame_budget * 1e3:.1f} ms)")
+        if counts is not None:
+            lines.extend(f"{name:<10} {count}" for (name, count) in counts.items())
+        return "\n".join(lines)
+
+
 class MQSpace(pymunk.Space, QGraphicsScene):
     """ MQSpace is a class inheriting from pymunk's Space class and PyQt's QGraphicsScene class;
         an instance of MQSpace can be populated by Item instances, which are handled by pymunk's Space methods
         (for physical simulation) and by PyQt Graphics Scene (for representation in a PyQt Graphics View);
-        after each pymunk simulation step, QGraphicsItem's position and rotation are updated according to the item shape's.
+        after each pymunk simulation step, QGraphicsItem's position and rotation are updated according to
+        the item shape's;
+        a headless MQSpace has no scene, window, view nor sound: it is driven by run or step_n, as fast as possible.
     """
 
-    __slots__ = ("timer", "pressed_keys", "just_pressed_key", "just_pressed_mouse_button",
-                 "attractive_item", "attractive_item_force", "attractive_item_radius",
+    __slots__ = ("headless", "timer", "pressed_keys", "just_pressed_key", "just_pressed_mouse_button",
+                 "attractive_item", "attractive_item_force", "attractive_item_radius", "gravity_field",
                  "central_item", "player_item", "items_to_remove", "items_to_set_kinematic",
-                 "kinematic_items", "main_window", "main_view", "time", "tracing_item",
-                 "trace_counter", "trace_prev_position", "actions_by_single_key",
-                 "actions_by_repeat_key", "dt_s", "timer_elapse", "mouse_hook_item")
+                 "kinematic_items", "transient_scheduler", "particle_systems", "item_pools", "main_window",
+                 "main_view", "time", "trails",
+                 "actions_by_single_key",
+                 "actions_by_repeat_key", "dt_s", "timer_elapse", "time_scale", "time_accumulator",
+                 "last_frame_time", "mouse_hook_item", "profiler", "performance_hud", "streamed_items",
+                 "collision_event_bus", "collision_registry",
+                 "is_first_frame_painted", "static_layer", "static_tile_cache", "render_preset",
+                 "lod_layer", "stale_items", "nb_culled_updates", "total_culled_updates")
 
     trace_pen = QPen(Qt.white)
     trace_pen.setWidth(0)
 
-    def __init__(self, scrolling_margin=None):
+    def __init__(self, scrolling_margin=None, headless=False):
         global space
         space = self
+        startup_profiler.mark("user code")
+        self.headless = headless
         pymunk.Space.__init__(self)
         if COLLISION_BIAS is not None:
             self.collision_bias = COLLISION_BIAS
-        QGraphicsScene.__init__(self)
-        # TODO
-        self.setSceneRect(-2e6, -2e6, 4e6, 4e6)
-        # self.setSceneRect(-2e3,-2e3,4e3,4e3)
-        self.setBackgroundBrush(QBrush(Qt.black))
-        self.timer = QTimer()
-        self.timer.timeout.connect(self._timer_event)
+        if headless:
+            self.timer = None
+            self.static_layer = None
+            self.static_tile_cache = None
+        else:
+            get_application()
+            startup_profiler.mark("application")
+            QGraphicsScene.__init__(self)
+            # TODO
+            self.setSceneRect(-2e6, -2e6, 4e6, 4e6)
+            # self.setSceneRect(-2e3,-2e3,4e3,4e3)
+            self.setBackgroundBrush(QBrush(Qt.black))
+            self.static_layer = None
+            self.static_tile_cache = None
+            if SCENE_INDEX == "bsp":
+                self.setBspTreeDepth(SCENE_BSP_DEPTH)
+            else:
+                self.setItemIndexMethod(QGraphicsScene.NoIndex)
+            if SCENE_INDEX == "hybrid" or STATIC_TILE_CACHE:
+                # painted by View.drawBackground; its scene rect grows with its items
+                self.static_layer = QGraphicsScene()
+                self.static_layer.setBspTreeDepth(SCENE_BSP_DEPTH)
+                if STATIC_TILE_CACHE:
+                    self.static_tile_cache = StaticTileCache(self.static_layer)
+            self.timer = QTimer()
+            self.timer.timeout.connect(self._timer_event)
         self.pressed_keys = set()
         self.just_pressed_key = None
         self.keyboard_modifiers = 0
@@ -663,23 +2286,54 @@ class MQSpace(pymunk.Space, QGraphicsScene):
         self.attractive_item = None
         self.attractive_item_force = None
         self.attractive_item_radius = None
+        self.gravity_field = GravityField()
         self.central_item = None
         self.player_item = None
         self.items_to_remove = set()
         self.items_to_set_kinematic = set()
+        self.collision_event_bus = CollisionEventBus()
+        self.collision_registry = CollisionRegistry()
         self.kinematic_items = []
-        self.main_window = MainWindow(self, scrolling_margin)
-        self.main_view = self.main_window.main_view
+        self.transient_scheduler = TransientScheduler()
+        self.particle_systems = []
+        self.item_pools = {}
+        self.streamed_items = []
+        # moving items whose graphics item is not up to date, being far from the views (see sync_qg_items)
+        self.stale_items = set()
+        self.nb_culled_updates = 0
+        self.total_culled_updates = 0
+        if headless:
+            self.main_window = None
+            self.main_view = None
+            self.lod_layer = None
+            self.render_preset = None
+        else:
+            self.main_window = MainWindow(self, scrolling_margin)
+            self.main_view = self.main_window.main_view
+            self.lod_layer = LodLayer(self.sceneRect())
+            self.addItem(self.lod_layer)
+            self.render_preset = None
+            self.set_render_preset(RENDER_PRESET)
+            startup_profiler.mark("window")
         self.time = 0.0
-        self.dt_s = None
-        self.timer_elapse = None
-        self.tracing_item = None
-        self.trace_counter = None
-        self.trace_prev_position = None
+        # fixed simulation time step (in sec)
+        self.dt_s = SIMULATION_TIME_STEP
+        self.timer_elapse = TIMER_ELAPSE
+        # simulated time per wall-clock time
+        self.time_scale = SIMULATION_TIME_STEP / TIMER_ELAPSE
+        # simulated time not yet simulated (in sec)
+        self.time_accumulator = 0.0
+        self.last_frame_time = None
+        self.profiler = FrameProfiler(TIMER_ELAPSE)
+        self.performance_hud = None
+        # trail items, by traced item
+        self.trails = {}
         self.actions_by_single_key = {}
         self.actions_by_repeat_key = {}
         self.is_mouse_hook_on = False
+        self.is_first_frame_painted = False
         self.do_initial_setup()
+        startup_profiler.mark("initial setup")
         pen = QPen(Qt.white)
         pen.setStyle(Qt.DashLine)
         pen.setWidth(2)
@@ -688,8 +2342,10 @@ class MQSpace(pymunk.Space, QGraphicsScene):
                                           #brush=QBrush(QColor(255, 20, 20)),
                                           pen=pen,
                                           body_type=KINEMATIC)
-        self.mouse_hook_item.qg_item.setZValue(1)
-        Sound.init()
+        if not headless:
+            self.mouse_hook_item.qg_item.setZValue(1)
+        Sound.init(silent=headless or not SOUND_ENABLED)
+        startup_profiler.mark("sound")
         # if Beep is not None:
         #     self.init_sound()
 
@@ -716,15 +2372,16 @@ class MQSpace(pymunk.Space, QGraphicsScene):
         self.actions_by_repeat_key.update(actions_by_repeat_key)
 
     def increase_speed(self):
-        self.dt_s += DELTA_ELAPSE
+        self.time_scale += DELTA_ELAPSE / self.timer_elapse
 
     def decrease_speed(self):
-        if self.dt_s >= DELTA_ELAPSE:
-            self.dt_s -= DELTA_ELAPSE
+        if self.time_scale >= DELTA_ELAPSE / self.timer_elapse:
+            self.time_scale -= DELTA_ELAPSE / self.timer_elapse
 
     def set_central_item(self, item):
         self.central_item = item
-        self.main_view.recenter(with_rotation=False)
+        if self.main_view is not None:
+            self.main_view.recenter(with_rotation=False)
 
     def set_player_item(self, item):
         self.player_item = item
@@ -732,43 +2389,139 @@ class MQSpace(pymunk.Space, QGraphicsScene):
     def distance_player_item(self, item):
         return self.player_item.position.get_distance(item.position)
 
+    def collision_type(self, item_class):
+        """ returns the collision type of the shapes of the items of the given class
+        """
+        return self.collision_registry.collision_type(item_class)
+
+    def on_collision_event(self, collision_type_a, collision_type_b, handler):
+        """ registers handler(items_a, items_b, events), called after each simulation step where shapes of the
+            given collision types (None for any) started to collide; the items are the colliding bodies, events is
+            an array of COLLISION_EVENT_DTYPE records (contact point, normal impulse, relative speed); the handler
+            replaces any handler previously registered for the same collision types
+        """
+        self.collision_event_bus.register(self, collision_type_a, collision_type_b, handler)
+
     def set_attractive_item(self, item, force, radius):
-        self.attractive_item = item
-        self.attractive_item_force = force
-        self.attractive_item_radius = radius
+        """ sets the given item as the unique attractive item (None for removing all attractive items)
+        """
+        self.gravity_field.attractors.clear()
+        self.attractive_item = None
+        if item is not None:
+            self.add_attractive_item(item, force, radius)
+
+    def add_attractive_item(self, item, force, radius):
+        """ adds the given item as attractive item; attributes attractive_item, attractive_item_force and
+            attractive_item_radius refer to the first attractive item
+        """
+        self.gravity_field.add_attractor(item, force, radius)
+        if self.attractive_item is None:
+            self.attractive_item = item
+            self.attractive_item_force = force
+            self.attractive_item_radius = radius
+
+    def remove_attractive_item(self, item):
+        self.gravity_field.remove_attractor(item)
+        if self.attractive_item is item:
+            (self.attractive_item, self.attractive_item_force, self.attractive_item_radius) = \
+                self.gravity_field.attractors[0] if len(self.gravity_field.attractors) > 0 else (None, None, None)
+
+    def set_n_body_gravity(self, gravitational_constant, opening_angle=0.5, softening=1.0):
+        """ activates the mutual attraction of all dynamic items, using a Barnes-Hut tree with the given
+            opening angle (0 means exact computation); gravitational_constant None deactivates it
+        """
+        self.gravity_field.set_n_body(gravitational_constant, opening_angle, softening)
+
+    def apply_gravity(self):
+        self.gravity_field.apply(self.bodies)
 
     def center_view_on_central_item(self, with_rotation, permanent):
-        self.main_view.center_on_item(self.central_item, with_rotation, permanent, False)
+        if self.main_view is not None:
+            self.main_view.center_on_item(self.central_item, with_rotation, permanent, False)
 
     def center_view_on_player(self, with_rotation, permanent, scrolling_margin=False):
-        self.main_view.center_on_item(self.player_item, with_rotation, permanent, True, scrolling_margin)
+        if self.main_view is not None:
+            self.main_view.center_on_item(self.player_item, with_rotation, permanent, True, scrolling_margin)
 
     def toggle_trace(self, item):
-        if self.tracing_item is item:
-            self.tracing_item = None
-        else:
-            self.tracing_item = item
-        self.trace_counter = 0
+        """ starts drawing the trail of the given item or, if it is already traced, removes its trail;
+            any number of items may be traced at once
+        """
+        trail = self.trails.pop(item, None)
+        if trail is not None:
+            self.removeItem(trail)
+        elif not self.headless:
+            trail = TrailItem(item, MQSpace.trace_pen)
+            self.addItem(trail)
+            self.trails[item] = trail
+
+    def transfer_trace(self, item, new_item):
+        """ continues the trail of the given item, if it is traced, with the positions of new_item
+        """
+        trail = self.trails.pop(item, None)
+        if trail is not None:
+            trail.item = new_item
+            self.trails[new_item] = trail
+
+    def update_trails(self):
+        for trail in self.trails.values():
+            trail.sample()
 
     def show(self):
+        startup_profiler.mark("user code")
         # self.main_window.setWindowFlags(Qt.CustomizeWindowHint | Qt.FramelessWindowHint)
         # self.main_window.showFullScreen()
         self.main_window.show()
         # self.main_window.main_view.recenter(with_rotation=False)
         self.main_view.setTransformationAnchor(QGraphicsView.NoAnchor)
+        startup_profiler.mark("show")
+
+    def do_first_frame_painted(self):
+        """ called once, after the first paint of the main view: the remaining startup work is started
+        """
+        self.is_first_frame_painted = True
+        startup_profiler.mark("first frame")
+        if STARTUP_PROFILE:
+            print(startup_profiler.report(), file=sys.stderr)
+        Sound.load_in_background()
 
     def start(self, simulator_time_step=SIMULATION_TIME_STEP, timer_elapse=TIMER_ELAPSE):
+        assert not self.headless, "a headless MQSpace is driven by run or step_n"
         self.dt_s = simulator_time_step
         self.timer_elapse = timer_elapse
+        self.profiler.frame_budget = timer_elapse
+        self.time_scale = simulator_time_step / timer_elapse
+        self.time_accumulator = 0.0
+        self.last_frame_time = perf_counter()
         self.timer.start(int(timer_elapse * 1e3))
         sys.exit(app.exec_())
 
     def stop(self):
-        self.timer.stop()
+        if self.timer is not None:
+            self.timer.stop()
 
     def close(self):
         self.stop()
-        self.main_window.close()
+        if self.main_window is not None:
+            self.main_window.close()
+
+    def step_n(self, nb_steps=1):
+        """ treats one frame made of nb_steps simulation steps, without waiting for the timer
+        """
+        self.advance(nb_steps)
+
+    def run(self, nb_steps, steps_per_frame=1):
+        """ runs nb_steps simulation steps as fast as possible, by frames of steps_per_frame steps;
+            returns the number of simulation steps per second of wall-clock time
+        """
+        start_time = perf_counter()
+        (nb_frames, nb_remaining_steps) = divmod(nb_steps, steps_per_frame)
+        for _ in range(nb_frames):
+            self.advance(steps_per_frame)
+        if nb_remaining_steps > 0:
+            self.advance(nb_remaining_steps)
+        duration = perf_counter() - start_time
+        return nb_steps / duration if duration > 0.0 else float("inf")
 
     def toggle_help(self):
         self.display_help = not self.display_help
@@ -786,45 +2539,312 @@ class MQSpace(pymunk.Space, QGraphicsScene):
         pass
 
     def _timer_event(self):
+        # the wall-clock time elapsed since last event is simulated in fixed steps of dt_s
+        now = perf_counter()
+        if self.last_frame_time is not None:
+            self.time_accumulator += (now - self.last_frame_time) * self.time_scale
+        self.last_frame_time = now
+        nb_steps = int(self.time_accumulator / self.dt_s)
+        if nb_steps > MAX_STEPS_PER_FRAME:
+            # avoids the spiral of death: the late simulated time is dropped
+            nb_steps = MAX_STEPS_PER_FRAME
+            self.time_accumulator = nb_steps * self.dt_s
+        self.time_accumulator -= nb_steps * self.dt_s
+        alpha = self.time_accumulator / self.dt_s if RENDER_INTERPOLATION else None
+        self.advance(nb_steps, alpha)
+
+    def advance(self, nb_steps, alpha=None):
+        """ treats one frame: inputs, nb_steps simulation steps, then graphical update; if alpha is not None,
+            rendered positions are interpolated between the last two simulation states (0 <= alpha < 1)
+        """
+        profiler = self.profiler
+        profiler.start_frame()
+        if self.headless:
+            # nothing is rendered, so only the pymunk state is maintained
+            self.treat_keys_and_buttons()
+            profiler.lap("inputs")
+            for _ in range(nb_steps):
+                self.treat_repeat_keys_and_buttons()
+                self.simulation_step()
+            self.update_streamed_items()
+            profiler.lap("streaming")
+            self.remove_items_out_of_universe()
+            profiler.lap("sync")
+            self.do_timer_event()
+            profiler.lap("user")
+            Sound.flush()
+            profiler.lap("sound")
+            profiler.end_frame()
+            return
+        if self.trails:
+            self.update_trails()
+        profiler.lap("trace")
+        self.treat_keys_and_buttons()
+        profiler.lap("inputs")
+        for step_idx in range(nb_steps):
+            if alpha is not None and step_idx == nb_steps - 1:
+                self.save_previous_transforms()
+                profiler.lap("sync")
+            self.treat_repeat_keys_and_buttons()
+            self.simulation_step()
+        self.update_streamed_items()
+        profiler.lap("streaming")
+        self.sync_qg_items(alpha)
+        profiler.lap("sync")
+        if SCENE_INDEX_PROFILE:
+            self.profile_scene_index()
+        self.do_timer_event()
+        profiler.lap("user")
+        for view in self.views():
+            view.do_timer_event()
+        if self.stale_items:
+            # the views may have moved (followed items, jumps), reveal the culled items they now show
+            self.sync_stale_items()
+        if profiler.nb_frames % LOD_UPDATE_PERIOD == 0:
+            self.update_lod()
+        if AUTO_RENDER_PRESET and profiler.nb_frames % RENDER_PRESET_CHECK_PERIOD == 0:
+            self.adapt_render_preset()
+        if self.lod_layer.item_set:
+            self.lod_layer.update()
+        profiler.lap("views")
+        if self.player_item is not None:
+            Sound.set_listener(self.player_item.position)
+        Sound.flush()
+        profiler.lap("sound")
+        profiler.end_frame()
+        if self.performance_hud is not None and profiler.nb_frames % HUD_REFRESH_PERIOD == 0:
+            self.performance_hud.setText(profiler.report(self.statistics()))
+            self.performance_hud.adjustSize()
+
+    def simulation_step(self):
+        profiler = self.profiler
         Item.remove_transient_items()
+        profiler.lap("transient")
         self.treat_kinematic_items()
-        if self.tracing_item:
-            self.draw_trace()
-        self.treat_keys_and_buttons()
-        for item in self.items_to_remove:
-            self.remove_item(item)
-        self.items_to_remove.clear()
+        profiler.lap("kinematic")
+        while len(self.items_to_remove) > 0:
+            # removing items may require new removals (e.g. in do_finalize)
+            items_to_remove = tuple(self.items_to_remove)
+            self.items_to_remove.clear()
+            self.remove_items(items_to_remove)
+        profiler.lap("removal")
         self.time += self.dt_s
         # pymunk simulation
+        self.apply_gravity()
+        profiler.lap("gravity")
         self.step(self.dt_s)
-        self.do_timer_event()
+        profiler.lap("physics")
+        self.collision_event_bus.dispatch()
+        profiler.lap("collisions")
+        for particle_system in self.particle_systems:
+            particle_system.step(self.dt_s, self)
+        profiler.lap("particles")
+
+    def profile_scene_index(self):
+        """ measures, in the "index" profiler phase, the update of the scene indexes after the items moved and,
+            in the "lookup" phase, the search of the items visible in the main view, as done when painting
+        """
+        profiler = self.profiler
+        layers = (self,) if self.static_layer is None else (self, self.static_layer)
+        # querying an empty area forces the pending index updates
+        empty_rect = QRectF(0.0, 0.0, 0.0, 0.0)
+        for layer in layers:
+            layer.items(empty_rect)
+        profiler.lap("index")
+        visible_rect = self.main_view.mapToScene(self.main_view.viewport().rect()).boundingRect()
+        for layer in layers:
+            layer.items(visible_rect, Qt.IntersectsItemBoundingRect, Qt.DescendingOrder)
+        profiler.lap("lookup")
+
+    def set_render_preset(self, render_preset):
+        """ applies the given render preset (see RENDER_PRESETS) to the main view
+        """
+        preset = RENDER_PRESETS[render_preset]
+        self.render_preset = render_preset
+        view = self.main_view
+        view.setRenderHint(QPainter.Antialiasing, preset["antialiasing"])
+        view.setViewportUpdateMode(preset["viewport_update_mode"])
+        view.setOptimizationFlags(QGraphicsView.OptimizationFlags(preset["optimization_flags"]))
+        self.update_lod()
+        view.viewport().update()
+
+    def adapt_render_preset(self):
+        """ switches to the next faster render preset if the recent median paint time exceeds RENDER_PAINT_BUDGET,
+            to the next finer one if it is far below
+        """
+        render_presets = tuple(RENDER_PRESETS)
+        preset_idx = render_presets.index(self.render_preset)
+        paint_time = self.profiler.recent_median("paint", RENDER_PRESET_CHECK_PERIOD)
+        if paint_time > RENDER_PAINT_BUDGET and preset_idx < len(render_presets) - 1:
+            self.set_render_preset(render_presets[preset_idx + 1])
+        elif paint_time < RENDER_PAINT_BUDGET * RENDER_PRESET_UPGRADE_RATIO and preset_idx > 0:
+            self.set_render_preset(render_presets[preset_idx - 1])
+
+    def update_lod(self):
+        """ hides the dynamic items smaller, on the main view, than the lod_threshold of the render preset and has
+            them drawn as points by the LOD layer instead; the size of an item covers its child graphics items
+            (static, kinematic and streamed items, like levels, are never drawn as points)
+        """
+        lod_threshold = RENDER_PRESETS[self.render_preset]["lod_threshold"]
+        lod_layer = self.lod_layer
+        if lod_threshold == 0.0:
+            if lod_layer.item_set:
+                lod_layer.set_items(())
+            return
+        transform = self.main_view.transform()
+        # scale of the view, whatever its rotation
+        scale = abs(transform.determinant()) ** 0.5
+        max_size = lod_threshold / scale
+        tiny_items = []
+        for body in self.bodies:
+            if (isinstance(body, Item) and body.body_type == DYNAMIC and not body.is_streamed
+                    and body not in self.stale_items):
+                qg_item = body.qg_item
+                rect = qg_item.boundingRect().united(qg_item.childrenBoundingRect())
+                if rect.width() < max_size and rect.height() < max_size:
+                    tiny_items.append(body)
+        lod_layer.set_items(tiny_items)
+
+    def statistics(self):
+        """ returns the numbers of bodies, shapes, contact pairs (arbiters), graphics items, stale graphics items
+            and graphics updates culled in the last frame
+        """
+        return {"bodies": len(self.bodies),
+                "shapes": len(self.shapes),
+                "arbiters": len(self._get_arbiters()),
+                "qg_items": 0 if self.headless else len(self.items())
+                            + (0 if self.static_layer is None else len(self.static_layer.items())),
+                "stale_items": len(self.stale_items),
+                "culled_updates": self.nb_culled_updates}
+
+    def toggle_performance_hud(self):
+        """ shows or hides, on the main view, the frame phases percentiles and the space statistics
+        """
+        if self.performance_hud is None:
+            self.performance_hud = QLabel(self.main_view)
+            self.performance_hud.setStyleSheet("QLabel { font-family: monospace; font-size: 14px; color : white; "
+                                               "background-color: rgba(0, 0, 0, 160); }")
+            self.performance_hud.setText(self.profiler.report(self.statistics()))
+            self.performance_hud.adjustSize()
+            self.performance_hud.show()
+        else:
+            self.performance_hud.deleteLater()
+            self.performance_hud = None
+
+    def update_streamed_items(self):
+        for item in self.streamed_items:
+            item.update_streaming(self)
+
+    def save_previous_transforms(self):
+        for item in self.bodies:
+            (x, y) = item.position
+            item.previous_transform = (x, y, item.angle)
+
+    def culling_rect(self):
+        """ returns (x_min, y_min, x_max, y_max), the bounding rectangle of the visible rectangles of the views,
+            expanded by SYNC_CULLING_MARGIN, or None if there is no culling (disabled or no visible view)
+        """
+        if not SYNC_CULLING:
+            return None
+        culling_rect = None
         for view in self.views():
-            view.do_timer_event()
+            if view.isVisible():
+                rect = view.mapToScene(view.viewport().rect()).boundingRect()
+                culling_rect = rect if culling_rect is None else culling_rect.united(rect)
+        if culling_rect is None:
+            return None
+        return (culling_rect.left() - SYNC_CULLING_MARGIN, culling_rect.top() - SYNC_CULLING_MARGIN,
+                culling_rect.right() + SYNC_CULLING_MARGIN, culling_rect.bottom() + SYNC_CULLING_MARGIN)
+
+    def sync_qg_items(self, alpha=None):
+        """ copies the position and rotation of moved items into their QGraphicsItem, in one pass after the
+            pymunk steps; sleeping items are skipped and items that left the universe are removed;
+            if alpha is not None, the copied transform is interpolated between the previous and current states;
+            the items lying entirely out of the culling rect are only marked as stale and hidden, except the
+            streamed items and the items followed by a view; they are updated and shown, even if sleeping, when
+            they enter this rect again
+        """
+        items_out_of_universe = []
+        stale_items = self.stale_items
+        culling_rect = self.culling_rect()
+        if culling_rect is not None:
+            (x_min, y_min, x_max, y_max) = culling_rect
+            always_synced_items = {view.view_center_item for view in self.views()}
+        nb_culled_updates = 0
+        for item in self.bodies:
+            if item.is_sleeping and item not in stale_items:
+                continue
+            (x, y) = item.position
+            angle = item.angle
+            if alpha is not None and item.previous_transform is not None:
+                (px, py, pangle) = item.previous_transform
+                transform = (px + (x - px) * alpha, py + (y - py) * alpha, pangle + (angle - pangle) * alpha)
+            else:
+                transform = (x, y, angle)
+            if transform != item.synced_transform:
+                if UNIVERSE_SIZE is not None and (abs(x) > UNIVERSE_SIZE or abs(y) > UNIVERSE_SIZE):
+                    items_out_of_universe.append(item)
+                elif (culling_rect is not None and not (x_min <= x <= x_max and y_min <= y <= y_max)
+                      and not item.is_streamed and item not in always_synced_items and item.is_out_of(culling_rect)):
+                    if item not in stale_items:
+                        self.set_stale(item)
+                    nb_culled_updates += 1
+                else:
+                    item.sync_qg_item(*transform)
+                    item.synced_transform = transform
+                    if item in stale_items:
+                        stale_items.discard(item)
+                        item.qg_item.setVisible(True)
+        self.nb_culled_updates = nb_culled_updates
+        self.total_culled_updates += nb_culled_updates
+        if items_out_of_universe:
+            self.remove_items(items_out_of_universe)
+
+    def set_stale(self, item):
+        """ marks the given item as stale: its graphics item is hidden, so that it is not painted at an outdated
+            position, and it is not drawn as a point by the LOD layer
+        """
+        if self.lod_layer is not None and item in self.lod_layer.item_set:
+            self.lod_layer.discard(item)
+        item.qg_item.setVisible(False)
+        self.stale_items.add(item)
+
+    def sync_stale_item(self, item):
+        """ updates and shows the graphics item of the given item if it is stale, as required before reading its
+            position or rotation
+        """
+        if item in self.stale_items:
+            (x, y) = item.position
+            item.synced_transform = (x, y, item.angle)
+            item.sync_qg_item(*item.synced_transform)
+            item.qg_item.setVisible(True)
+            self.stale_items.discard(item)
+
+    def sync_stale_items(self):
+        """ updates and shows the stale items inside the current culling rect; to be called after the views moved
+            (following an item, zoom), so that no item near the views is missing when painted
+        """
+        culling_rect = self.culling_rect()
+        if culling_rect is None:
+            for item in tuple(self.stale_items):
+                self.sync_stale_item(item)
+            return
+        for item in tuple(self.stale_items):
+            if not item.is_out_of(culling_rect):
+                self.sync_stale_item(item)
 
-    def draw_trace(self):
-        # tracing_item_position = self.tracing_item.position
-        item_scene_position = self.tracing_item.qg_item.scenePos()
-        tracing_item_position = (item_scene_position.x(), item_scene_position.y())
-        if self.trace_counter == 0:
-            self.trace_prev_position = tracing_item_position
-            self.trace_counter = +1
-        elif self.trace_counter == +TRACE_LENGTH:
-            if tracing_item_position != self.trace_prev_position:
-                (x0, y0) = tracing_item_position
-                (x1, y1) = self.trace_prev_position
-                # TODO
-                qg_line_item = QGraphicsLineItem(x0, y0, x1, y1)
-                qg_line_item.setPen(MQSpace.trace_pen)
-                qg_line_item.setZValue(-1)
-                self.addItem(qg_line_item)
-                self.trace_counter = -TRACE_LENGTH
-        else:
-            self.trace_counter += 1
+    def remove_items_out_of_universe(self):
+        if UNIVERSE_SIZE is not None:
+            self.remove_items([item for item in self.bodies if not item.is_sleeping
+                               and (abs(item.position.x) > UNIVERSE_SIZE or abs(item.position.y) > UNIVERSE_SIZE)])
 
     def treat_kinematic_items(self):
         while len(self.items_to_set_kinematic) > 0:
             item = self.items_to_set_kinematic.pop()
             if item.is_alive:
+                # the item's shapes are dropped, so it cannot be reused
+                item.pool = None
+                self.move_to_dynamic_layer(item)
                 item.body_type = KINEMATIC
                 for shape in item.child_shapes:
                     self.remove(shape)
@@ -858,7 +2878,12 @@ class MQSpace(pymunk.Space, QGraphicsScene):
     NO_ACTION = (None, None, "")
 
     def treat_keys_and_buttons(self):
-        self.keyboard_modifiers = int(QGuiApplication.queryKeyboardModifiers())
+        """ treats, once per frame, the actions of the keys and mouse buttons just pressed; the actions of the
+            held keys and buttons, which usually apply impulses, are called at each simulation step instead
+            (see treat_repeat_keys_and_buttons), so that their effect does not depend on the frame rate
+        """
+        if not self.headless:
+            self.keyboard_modifiers = int(QGuiApplication.queryKeyboardModifiers())
         self.info = None
         # call once the registered callback function associated to last key pressed, if any
         if self.just_pressed_key is not None:
@@ -867,12 +2892,11 @@ class MQSpace(pymunk.Space, QGraphicsScene):
             if func is not None:
                 self.info = info
                 func(*args)
-        # call the registered callback function(s) associated to currently pressed key(s), if any
+        # show the info of the registered callback function(s) associated to currently pressed key(s), if any
         for key in space.pressed_keys:
             (func, args, info) = self.actions_by_repeat_key.get((self.keyboard_modifiers, key), MQSpace.NO_ACTION)
             if func is not None:
                 self.info = info
-                func(*args)
         # call once the registered callback function associated to last mouse button pressed, if any
         if self.just_pressed_mouse_button is not None:
             (func, args, info) = self.actions_by_single_key.get((self.keyboard_modifiers | MOUSE_BUTTON,
@@ -881,13 +2905,25 @@ class MQSpace(pymunk.Space, QGraphicsScene):
             if func is not None:
                 func(*args)
             self.just_pressed_mouse_button = None
+
+    def treat_repeat_keys_and_buttons(self):
+        """ calls, once per simulation step, the actions of the currently pressed keys and mouse button
+        """
+        # call the registered callback function(s) associated to currently pressed key(s), if any
+        for key in self.pressed_keys:
+            (func, args, info) = self.actions_by_repeat_key.get((self.keyboard_modifiers, key), MQSpace.NO_ACTION)
+            if func is not None:
+                func(*args)
         # call the registered callback function associated to currently pressed mouse button, if any
-        (func, args, info) = self.actions_by_repeat_key.get((self.keyboard_modifiers | MOUSE_BUTTON,
-                                                             int(QApplication.mouseButtons())), MQSpace.NO_ACTION)
-        if func is not None:
-            func(*args)
+        if not self.headless:
+            (func, args, info) = self.actions_by_repeat_key.get((self.keyboard_modifiers | MOUSE_BUTTON,
+                                                                 int(QApplication.mouseButtons())), MQSpace.NO_ACTION)
+            if func is not None:
+                func(*args)
 
     def get_cursor_position(self):
+        if self.main_view is None:
+            return (0.0, 0.0)
         # position = self.main_view.mapFromGlobal(QCursor().pos())
         # position = self.main_view.mapToScene(QCursor().pos())
         # position = self.main_view.mapToScene(QCursor().pos().x(), -QCursor().pos().y())
@@ -900,9 +2936,12 @@ class MQSpace(pymunk.Space, QGraphicsScene):
         if not item.is_alive:
             if item.body_type != STATIC:
                 self.add(item)
-            self.addItem(item.qg_item)
-            if item.qg_line_item_velocity is not None:
-                self.addItem(item.qg_line_item_velocity)
+            if not self.headless:
+                self.layer_of(item).addItem(item.qg_item)
+                if item.qg_line_item_velocity is not None:
+                    self.addItem(item.qg_line_item_velocity)
+                if self.static_layer is not None and item.qg_item.scene() is self.static_layer:
+                    self.static_layer_changed(item.qg_item.sceneBoundingRect())
             """
             if not (item.body_type == KINEMATIC and item.is_airy):
                 for shape in item.child_shapes:
@@ -910,12 +2949,41 @@ class MQSpace(pymunk.Space, QGraphicsScene):
             # self.add(*item.child_shapes)
             for shape in item.child_shapes:
                 self.add(shape)
-            item.is_alive = True
-            # TODO remove handler in remove_item
-            if item.collision_function is not None:
-                # collision_handler = space.add_wildcard_collision_handler(id(item.__class__))
-                # collision_handler.begin = item.collision_function
-                space.on_collision(id(item.__class__), None, begin=item.collision_function)
+            self.do_item_added(item)
+
+    def add_items(self, items):
+        """ adds the given items in a batch: their bodies and shapes are added to pymunk in one call and, for
+            big batches, the scene index is suspended then rebuilt once; returns the number of items added
+            per second
+        """
+        start_time = perf_counter()
+        items = [item for item in items if not item.is_alive]
+        if not items:
+            return 0.0
+        self.add(*[item for item in items if item.body_type != STATIC],
+                 *[shape for item in items for shape in item.child_shapes])
+        if not self.headless:
+            index_method = self.suspend_scene_index(len(items))
+            for item in items:
+                self.layer_of(item).addItem(item.qg_item)
+                if item.qg_line_item_velocity is not None:
+                    self.addItem(item.qg_line_item_velocity)
+            self.resume_scene_index(index_method)
+            if self.static_layer is not None:
+                self.static_layer_changed()
+        for item in items:
+            self.do_item_added(item)
+        return len(items) / max(perf_counter() - start_time, 1e-9)
+
+    def do_item_added(self, item):
+        item.synced_transform = None
+        item.previous_transform = None
+        item.is_alive = True
+        if item.is_streamed:
+            self.streamed_items.append(item)
+            item.update_streaming(self)
+        if item.collision_function is not None:
+            self.collision_registry.register_collision_function(self, item.__class__)
 
     def remove_item(self, item):
         if item.is_alive:
@@ -923,8 +2991,6 @@ class MQSpace(pymunk.Space, QGraphicsScene):
             if not (item.body_type == KINEMATIC and item.is_airy):
                 for shape in item.child_shapes:
             """
-            if self.tracing_item is item:
-                self.toggle_trace(item)
             for shape in item.child_shapes:
                 self.remove(shape)
             # TODO: check this
@@ -932,11 +2998,139 @@ class MQSpace(pymunk.Space, QGraphicsScene):
             #    for child_item in item.child_items:
             #        self.remove_item(child_item)
             self.remove(item)
-            self.removeItem(item.qg_item)
-            if item.qg_line_item_velocity is not None:
-                self.removeItem(item.qg_line_item_velocity)
-            item.is_alive = False
-            item.do_finalize()
+            if not self.headless:
+                self.remove_qg_item(item)
+            self.do_item_removed(item)
+
+    def remove_items(self, items):
+        """ removes the given items in a batch, as add_items does; returns the number of items removed per second
+        """
+        start_time = perf_counter()
+        items = [item for item in set(items) if item.is_alive]
+        if not items:
+            return 0.0
+        self.remove(*[shape for item in items for shape in item.child_shapes],
+                    *[item for item in items if item.body_type != STATIC])
+        if not self.headless:
+            index_method = self.suspend_scene_index(len(items))
+            for item in items:
+                self.remove_qg_item(item)
+            self.resume_scene_index(index_method)
+        for item in items:
+            self.do_item_removed(item)
+        return len(items) / max(perf_counter() - start_time, 1e-9)
+
+    def do_item_removed(self, item):
+        if item in self.stale_items:
+            # shown again, for a possible reuse of the item
+            self.stale_items.discard(item)
+            item.qg_item.setVisible(True)
+        if self.lod_layer is not None and self.lod_layer.item_set:
+            self.lod_layer.discard(item)
+        if item in self.trails:
+            self.toggle_trace(item)
+        if any(attractor[0] is item for attractor in self.gravity_field.attractors):
+            # a removed (or pooled) item shall not attract from its last position
+            self.remove_attractive_item(item)
+        if item.is_streamed:
+            self.streamed_items.remove(item)
+        item.is_alive = False
+        self.items_to_remove.discard(item)
+        self.items_to_set_kinematic.discard(item)
+        item.do_finalize()
+        if item.pool is not None:
+            item.pool.release(item)
+
+    def layer_of(self, item):
+        """ returns the scene where the graphics item of the given item shall be added: with the "hybrid" index
+            or the static tile cache, the static layer for the static items, unless they are streamed, liquid or
+            above the dynamic items (positive z-value), the space itself otherwise
+        """
+        if (self.static_layer is not None and item.body_type == STATIC and not item.is_streamed
+                and item.liquid_callbacks is None and item.qg_item.zValue() <= 0):
+            return self.static_layer
+        return self
+
+    def move_to_dynamic_layer(self, item):
+        """ moves the graphics item of the given item from the static layer, if it is there, to the space itself,
+            as required before changing it
+        """
+        qg_item = item.qg_item
+        if self.static_layer is not None and qg_item.scene() is self.static_layer:
+            self.static_layer.removeItem(qg_item)
+            self.addItem(qg_item)
+            self.static_layer_changed(qg_item.sceneBoundingRect())
+
+    def static_layer_changed(self, rect=None):
+        """ drops the cached tiles intersecting the given scene rect (all of them if rect is None) and repaints
+            the background, after static items have been added to the static layer or removed from it
+        """
+        if self.static_tile_cache is not None:
+            self.static_tile_cache.invalidate(rect)
+        self.invalidate(QRectF() if rect is None else rect, QGraphicsScene.BackgroundLayer)
+
+    def remove_qg_item(self, item):
+        qg_item = item.qg_item
+        layer = qg_item.scene()
+        layer.removeItem(qg_item)
+        if layer is not self:
+            self.static_layer_changed(qg_item.sceneBoundingRect())
+        if item.qg_line_item_velocity is not None:
+            self.removeItem(item.qg_line_item_velocity)
+
+    def suspend_scene_index(self, nb_items):
+        """ if nb_items is at least BATCH_INDEX_SUSPENSION_THRESHOLD, switches the scene to NoIndex, so that the
+            items can be added or removed without maintaining the BSP tree; returns the index method to give
+            to resume_scene_index
+        """
+        index_method = self.itemIndexMethod()
+        if nb_items >= BATCH_INDEX_SUSPENSION_THRESHOLD and index_method != QGraphicsScene.NoIndex:
+            self.setItemIndexMethod(QGraphicsScene.NoIndex)
+        return index_method
+
+    def resume_scene_index(self, index_method):
+        """ restores the given index method; the BSP tree, if any, is then rebuilt once for all the items
+        """
+        if self.itemIndexMethod() != index_method:
+            self.setItemIndexMethod(index_method)
+
+    def set_pool_size(self, item_class, size):
+        """ sets the maximum number of removed items of the given class kept for reuse by spawn_item
+        """
+        pool = self.item_pools.get(item_class)
+        if pool is None:
+            self.item_pools[item_class] = ItemPool(size)
+        else:
+            pool.size = size
+            del pool.free_items[size:]
+
+    def spawn_item(self, item_class, position, angle, *args, **kwargs):
+        """ adds an item of the given class, reusing a pooled instance if available (the given arguments
+            are then passed to its reset method, otherwise to the class constructor), and returns it
+        """
+        pool = self.item_pools.get(item_class)
+        item = None if pool is None else pool.acquire()
+        if item is None:
+            item = item_class(position, angle, *args, **kwargs)
+            item.pool = pool
+        else:
+            item.reset(position, angle, *args, **kwargs)
+        self.add_item(item)
+        return item
+
+    def pool_statistics(self):
+        return {item_class.__name__: pool.statistics() for (item_class, pool) in self.item_pools.items()}
+
+    def add_particle_system(self, particle_system):
+        self.particle_systems.append(particle_system)
+        if not self.headless:
+            self.addItem(particle_system)
+        return particle_system
+
+    def remove_particle_system(self, particle_system):
+        self.particle_systems.remove(particle_system)
+        if not self.headless:
+            self.removeItem(particle_system)
 
     def add_circle_item(self, position, angle, radius, **kwargs):
         circle_item = CircleItem(position, angle, radius, **kwargs)
@@ -980,20 +3174,27 @@ class MQSpace(pymunk.Space, QGraphicsScene):
 
     def dismantle_compound_item(self, compound_item, recursive=False):
         assert isinstance(compound_item, CompoundItemDecomposable)
+        self.sync_stale_item(compound_item)
         self.remove_item(compound_item)
         for item in compound_item.child_items:
-            qg_item_pos = item.qg_item.scenePos()
-            item.position = (qg_item_pos.x(), qg_item_pos.y())
-            item.body.angle += compound_item.angle
-            item.qg_item.setRotation(degrees(item.body.angle))
+            if item.qg_item is None:
+                # headless: the child's position is still the one given at its creation, local to the compound
+                item.position = compound_item.local_to_world(item.position)
+                item.body.angle += compound_item.angle
+            else:
+                qg_item_pos = item.qg_item.scenePos()
+                item.position = (qg_item_pos.x(), qg_item_pos.y())
+                item.body.angle += compound_item.angle
+                item.qg_item.setRotation(degrees(item.body.angle))
             item.velocity = compound_item.velocity_at_world_point(item.position)
             for shape in item.child_shapes:
                 shape.body = item
             self.add_item(item)
             if recursive and isinstance(item, CompoundItemDecomposable):
                 self.dismantle_compound_item(item, recursive=True)
-        for item in compound_item.child_items:
-            compound_item.qg_item.removeFromGroup(item.qg_item)
+        if compound_item.qg_item is not None:
+            for item in compound_item.child_items:
+                compound_item.qg_item.removeFromGroup(item.qg_item)
 
     def toggle_mouse_hook(self):
         self.is_mouse_hook_on = not self.is_mouse_hook_on
@@ -1007,74 +3208,43 @@ class MQSpace(pymunk.Space, QGraphicsScene):
             self.remove_item(self.mouse_hook_item)
 
     def load_level(self, svg_filename):
-        from svgelements import SVG, SVGElement, Path, Rect, Text, Circle, Point
-        s_pos = (0, 0)
-        wall_color_code = None
-        svg = SVG.parse(svg_filename)
-        for svg_element in svg.elements():
-            if type(svg_element) is SVGElement:
-                if wall_color_code is None:
-                    wall_color_code = svg_element.values.get("pagecolor")
-                    if wall_color_code is None:
-                        wall_color_brush = QBrush(Qt.darkGray)
-                    else:
-                        wall_color_brush = QBrush(QColor(wall_color_code))
-            elif isinstance(svg_element, Text):
-                # TODO NOK svg_element.text is None (due to "tspan" child)
-                if svg_element.text == "S":
-                    true_pos = Point(svg_element.x, svg_element.y) * svg_element.transform
-                    s_pos = (true_pos.x, true_pos.y)
-                    #s_pos = (svg_element.x, svg_element.y)
-            elif isinstance(svg_element, Rect):
-                w = svg_element.width
-                h = svg_element.height
-                r = self.add_rect_item((svg_element.x+w/2, svg_element.y+h/2), 1*svg_element.rotation,
-                                   size=(w, h),
-                                   #body_type=DYNAMIC if svg_element.id.startswith("m") else STATIC,
-                                       body_type=DYNAMIC if svg_element.id.startswith("m")
-                                                        else (KINEMATIC if svg_element.fill.alpha < 255 else STATIC),
-                                   density=0.25e11,
-                                   liquid_damping=(0.95 if svg_element.fill.alpha < 255 else None),
-                                   #brush=QBrush(QColor(svg_element.fill.rgb)))
-                                   brush=QBrush(QColor(svg_element.fill.red, svg_element.fill.green, svg_element.fill.blue,
-                                                       svg_element.fill.alpha)))
-                if svg_element.fill.alpha < 255:
+        """ adds the items of the given SVG level and returns the start position ("S" text); the level is
+            loaded from its compiled form (see get_compiled_level), without parsing the SVG file
+        """
+        return self.build_level(get_compiled_level(svg_filename))
+
+    def build_level(self, level_records):
+        """ adds the items described by the given level records (see compile_level); returns the start position
+        """
+        start_position = (0, 0)
+        items = []
+        for (kind, args) in level_records:
+            if kind == "start":
+                start_position = args["position"]
+            elif kind == "rect":
+                r = RectItem(args["position"], args["angle"], size=args["size"],
+                             body_type=args["body_type"], density=0.25e11,
+                             liquid_damping=args["liquid_damping"],
+                             brush=QBrush(QColor.fromRgba(args["rgba"])))
+                if args["liquid_damping"] is not None and r.qg_item is not None:
                     r.qg_item.setZValue(1)
-            elif isinstance(svg_element, Circle):
-                assert svg_element.rx == svg_element.ry
-                self.add_circle_item((svg_element.cx, svg_element.cy), 0,
-                                   svg_element.rx,
-                                   body_type=DYNAMIC if svg_element.id.startswith("m") else STATIC,
-                                   density=0.25e11,
-                                   brush=QBrush(QColor(svg_element.fill.rgb)))
-            elif isinstance(svg_element, Path):
-                if svg_element.stroke.rgb is not None:
-                    (p1, p2) = tuple(svg_element.as_points())[::2]
-                    self.add_segment_item_from_line((p1.x, p1.y), (p2.x, p2.y),
-                                                    width=svg_element.stroke_width,
-                                                    color=svg_element.stroke.rgb,
-                                                    body_type=STATIC)
-                elif svg_element.fill.rgb > 0:
-                    vertices = tuple(tuple(point) for point in tuple(svg_element.as_points())[::2])
-                    x = self.add_polygon_item((0, 0), 0., vertices=vertices[::-1], friction=0.5,
-                                           body_type=DYNAMIC if svg_element.id.startswith("m") else STATIC,
-                                           density=0.3e11,
-                                           #color=svg_element.fill.rgb)
-                                           brush=QBrush(QColor(svg_element.fill.rgb)))
-                else:
-                    BORDER_WIDTH = 1000
-                    (x, y, w, h) = svg_element.bbox()
-                    inner_vertices = tuple(tuple(point) for point in tuple(svg_element.as_points())[::2])
-                    vertices = ((x     - BORDER_WIDTH , y     - BORDER_WIDTH),
-                                (x + w + BORDER_WIDTH , y     - BORDER_WIDTH),
-                                (x + w + BORDER_WIDTH , y + h + BORDER_WIDTH),
-                                (x     - BORDER_WIDTH , y + h + BORDER_WIDTH),
-                                (x     - BORDER_WIDTH+1e-6, y   - BORDER_WIDTH)) \
-                               + inner_vertices + (inner_vertices[0],)
-                    self.add_polygon_item((x, y), 0., vertices=vertices, friction=0.5,
-                                          body_type=STATIC,
-                                          brush=wall_color_brush)
-        return s_pos
+                items.append(r)
+            elif kind == "circle":
+                items.append(CircleItem(args["position"], 0, args["radius"],
+                                        body_type=args["body_type"], density=0.25e11,
+                                        brush=QBrush(QColor.fromRgba(args["rgba"]))))
+            elif kind == "segment":
+                items.append(SegmentItem.build_from_line(args["start_point"], args["end_point"], width=args["width"],
+                                                         color=args["color"], body_type=STATIC))
+            elif kind == "polygon":
+                kwargs = {"density": args["density"]} if args["density"] is not None else {}
+                items.append(PolygonItem(args["position"], 0., vertices=args["vertices"],
+                                         convex_polygons=args["convex_polygons"], friction=0.5,
+                                         body_type=args["body_type"],
+                                         brush=QBrush(QColor.fromRgba(args["rgba"])), **kwargs))
+        self.add_items(items)
+        return start_position
+
 
 class MainWindow(QMainWindow):
 
@@ -1127,6 +3297,24 @@ class View(QGraphicsView):
             self.setMouseTracking(True)
         self.hide_cursor()
 
+    def paintEvent(self, paint_event):
+        start_time = perf_counter()
+        QGraphicsView.paintEvent(self, paint_event)
+        scene = self.scene()
+        scene.profiler.add("paint", perf_counter() - start_time)
+        if not scene.is_first_frame_painted:
+            scene.do_first_frame_painted()
+
+    def drawBackground(self, painter, rect):
+        QGraphicsView.drawBackground(self, painter, rect)
+        scene = self.scene()
+        # the painter is already in scene coordinates
+        if scene.static_tile_cache is not None:
+            painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+            scene.static_tile_cache.draw(painter, rect)
+        elif scene.static_layer is not None:
+            scene.static_layer.render(painter, rect, rect, Qt.IgnoreAspectRatio)
+
     def resizeEvent(self, resize_event):
         QGraphicsView.resizeEvent(self, resize_event)
         self._width = self.width()
@@ -1227,6 +3415,8 @@ class View(QGraphicsView):
         dy_view = pos_view2.y() - pos_view1.y()
         self.h_scrollbar.setValue(self.h_scrollbar.value() + dx_view)
         self.v_scrollbar.setValue(self.v_scrollbar.value() + dy_view)
+        self.scene().sync_stale_items()
+        self.scene().update_lod()
 
 
 DYNAMIC = pymunk.Body.DYNAMIC
@@ -1234,4 +3424,17 @@ KINEMATIC = pymunk.Body.KINEMATIC
 STATIC = pymunk.Body.STATIC
 
 space = None
-app = QApplication(sys.argv)
+geometry_cache = None
+startup_profiler = StartupProfiler(_import_start_time)
+startup_profiler.mark("import munqy")
+# the QApplication is created at first non-headless MQSpace creation (see get_application)
+app = None
+
+
+def get_application():
+    """ returns the QApplication, creating it if needed
+    """
+    global app
+    if app is None:
+        app = QApplication.instance() or QApplication(sys.argv)
+    return app
@@ -1,93 +1,435 @@
+import wave
+import threading
+from math import pi, cos, sin, sqrt
+from time import perf_counter
+import numpy as np
+from PyQt5.QtCore import QThread, QIODevice
+# QtMultimedia and QtTextToSpeech are imported at first use, since they require audio libraries that may be missing
+# (e.g. on a server running headless simulations)
+#import queue
 
-from PyQt5.QtMultimedia import QSound, QSoundEffect
-from PyQt5.QtCore import QUrl, QTimer
-from PyQt5.QtTextToSpeech import QTextToSpeech
-#import threading, queue
-
-class SoundEffect(QSoundEffect):
-
-    def __init__(self,name,volume=1):
-        QSoundEffect.__init__(self)
-        self.timer = None
-        wav_file = QUrl.fromLocalFile("resources/"+name+'.wav')
-        self.setSource(wav_file)
-        self.setVolume(volume)
-        self.lowSoundEffect = QSoundEffect()
-        self.lowSoundEffect.setSource(wav_file)
-        self.lowSoundEffect.setVolume(volume/8)
-
-    def play_once(self, volume=None, is_low_volume=False):
-        # if self.isMuted():
-        #     self.setMuted(False)
-        #if not self.isPlaying():
+# maximum number of voices playing at the same time, all sound effects included
+MAX_VOICES = 12
+# maximum number of voices playing the same sound effect
+VOICES_PER_EFFECT = 3
+# volume under which a sound effect is not played
+AUDIBILITY_THRESHOLD = 0.005
+# distance from the listener beyond which a positioned sound effect is not played
+AUDIBLE_RADIUS = 5000.0
+# distance from the listener at which a positioned sound effect is played at half its volume
+REFERENCE_DISTANCE = 600.0
+# horizontal distance from the listener at which a positioned sound effect is fully panned on one side
+PAN_DISTANCE = 1000.0
+# output stream format: stereo, 16 bits, at the following sample rate
+MIXER_SAMPLE_RATE = 44100
+# size of the audio output buffer, in frames (i.e. the latency of the sound effects)
+MIXER_BUFFER_FRAMES = 2048
+
+
+def decode_wave(filename, sample_rate=MIXER_SAMPLE_RATE):
+    """ returns the samples of the given PCM wave file, as a float32 array of shape (nb_frames, 2),
+        resampled to the given sample rate
+    """
+    with wave.open(filename) as wave_file:
+        nb_channels = wave_file.getnchannels()
+        sample_width = wave_file.getsampwidth()
+        frame_rate = wave_file.getframerate()
+        data = wave_file.readframes(wave_file.getnframes())
+    if sample_width == 1:
+        samples = (np.frombuffer(data, np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(data, "<i2").astype(np.float32) / 32768.0
+    elif sample_width == 4:
+        samples = np.frombuffer(data, "<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"unsupported sample width in {filename}: {sample_width} bytes")
+    samples = samples.reshape(-1, nb_channels)[:, :2]
+    if nb_channels == 1:
+        samples = np.repeat(samples, 2, axis=1)
+    if frame_rate != sample_rate:
+        times = np.arange(len(samples) * sample_rate // frame_rate) * (frame_rate / sample_rate)
+        frame_indices = np.arange(len(samples))
+        samples = np.column_stack([np.interp(times, frame_indices, samples[:, channel_idx])
+                                   for channel_idx in range(2)])
+    return np.ascontiguousarray(samples, dtype=np.float32)
+
+
+class MixerVoice:
+    """ playback state of a sound effect in the mixer
+    """
+
+    __slots__ = ("samples", "frame_idx", "left_gain", "right_gain", "is_mixed")
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.frame_idx = len(samples)
+        self.left_gain = 0.0
+        self.right_gain = 0.0
+        self.is_mixed = False
+
+    def is_playing(self):
+        return self.frame_idx < len(self.samples)
+
+
+class Mixer:
+    """ mixes the playing voices into a single stereo stream; render is called by the audio output thread or,
+        without audio output (e.g. headless tests), directly by the user
+    """
+
+    __slots__ = ("voices", "lock", "output_thread")
+
+    def __init__(self):
+        self.voices = []
+        self.lock = threading.Lock()
+        self.output_thread = None
+
+    def play(self, voice, volume, pan=0.0):
+        """ plays the given voice from start; pan is in [-1,1], from left to right
+        """
+        # constant power panning, giving the given volume on both channels at center
+        angle = (pan + 1.0) * (pi / 4)
+        with self.lock:
+            voice.left_gain = volume * sqrt(2) * cos(angle)
+            voice.right_gain = volume * sqrt(2) * sin(angle)
+            voice.frame_idx = 0
+            if not voice.is_mixed:
+                voice.is_mixed = True
+                self.voices.append(voice)
+
+    def stop(self, voice):
+        with self.lock:
+            voice.frame_idx = len(voice.samples)
+
+    def render(self, nb_frames):
+        """ returns the next nb_frames frames of the mixed stream, as a float32 array of shape (nb_frames, 2)
+        """
+        buffer = np.zeros((nb_frames, 2), dtype=np.float32)
+        with self.lock:
+            if not self.voices:
+                return buffer
+            for voice in self.voices:
+                frame_idx = voice.frame_idx
+                chunk = voice.samples[frame_idx:frame_idx+nb_frames]
+                buffer[:len(chunk)] += chunk * np.array((voice.left_gain, voice.right_gain), dtype=np.float32)
+                voice.frame_idx = frame_idx + len(chunk)
+            finished_voices = [voice for voice in self.voices if not voice.is_playing()]
+            if finished_voices:
+                for voice in finished_voices:
+                    voice.is_mixed = False
+                self.voices = [voice for voice in self.voices if voice.is_mixed]
+        np.clip(buffer, -1.0, 1.0, out=buffer)
+        return buffer
+
+    def start_output(self):
+        """ starts the thread streaming the mix to the default audio device; returns False if there is no device
+        """
+        from PyQt5.QtMultimedia import QAudioDeviceInfo
+        if QAudioDeviceInfo.defaultOutputDevice().isNull():
+            return False
+        self.output_thread = MixerOutputThread(self)
+        self.output_thread.start()
+        return True
+
+    def stop_output(self):
+        if self.output_thread is not None:
+            self.output_thread.quit()
+            self.output_thread.wait()
+            self.output_thread = None
+
+
+class MixerDevice(QIODevice):
+    """ sequential device, read by QAudioOutput (pull mode), giving the mix as 16 bits stereo samples
+    """
+
+    def __init__(self, mixer):
+        QIODevice.__init__(self)
+        self.mixer = mixer
+
+    def isSequential(self):
+        return True
+
+    def bytesAvailable(self):
+        return 4 * MIXER_BUFFER_FRAMES + QIODevice.bytesAvailable(self)
+
+    def readData(self, max_size):
+        samples = self.mixer.render(max_size // 4)
+        return (samples * 32767.0).astype("<i2").tobytes()
+
+    def writeData(self, data):
+        return -1
+
+
+class MixerOutputThread(QThread):
+    """ thread owning the audio output: the mix is rendered in this thread, outside of the frames
+    """
+
+    def __init__(self, mixer):
+        QThread.__init__(self)
+        self.mixer = mixer
+
+    def run(self):
+        from PyQt5.QtMultimedia import QAudioOutput, QAudioFormat
+        audio_format = QAudioFormat()
+        audio_format.setSampleRate(MIXER_SAMPLE_RATE)
+        audio_format.setChannelCount(2)
+        audio_format.setSampleSize(16)
+        audio_format.setCodec("audio/pcm")
+        audio_format.setByteOrder(QAudioFormat.LittleEndian)
+        audio_format.setSampleType(QAudioFormat.SignedInt)
+        device = MixerDevice(self.mixer)
+        device.open(QIODevice.ReadOnly)
+        audio_output = QAudioOutput(audio_format)
+        audio_output.setBufferSize(4 * MIXER_BUFFER_FRAMES)
+        audio_output.start(device)
+        self.exec_()
+        audio_output.stop()
+        device.close()
+
+
+class SoundLoaderThread(QThread):
+    """ thread decoding the given sound effects, by decreasing priority, outside of the frames; each sound effect
+        is published, by setting its samples, as soon as it is decoded
+    """
+
+    def __init__(self, sound_effects):
+        QThread.__init__(self)
+        self.sound_effects = sorted(sound_effects, key=lambda sound_effect: sound_effect.priority, reverse=True)
+
+    def run(self):
+        for sound_effect in self.sound_effects:
+            sound_effect.load()
+
+
+class SoundEffect:
+    """ sound effect, decoded in background (see Sound.load_in_background), played on a small pool of mixer
+        voices; play requests are not played immediately: they are collected by the sound manager, which plays
+        them at the end of the frame, or once the sound effect is decoded
+    """
+
+    __slots__ = ("name", "volume", "priority", "samples", "voices", "next_voice_idx", "requested_volume",
+                 "requested_pan", "is_long_requested", "long_voice", "long_end_time")
+
+    def __init__(self, name, volume=1, priority=0):
+        self.name = name
+        self.volume = volume
+        self.priority = priority
+        self.samples = None
+        self.voices = []
+        self.next_voice_idx = 0
+        # loudest volume requested in the current frame, 0.0 if not requested, with its panning
+        self.requested_volume = 0.0
+        self.requested_pan = 0.0
+        self.is_long_requested = False
+        self.long_voice = None
+        self.long_end_time = 0.0
+
+    def load(self):
+        if self.samples is None:
+            # the samples are assigned once fully decoded, so that another thread never sees partial samples
+            self.samples = decode_wave("resources/"+self.name+'.wav')
+
+    def play_once(self, volume=None, is_low_volume=False, position=None):
+        """ requests to play the sound effect; if position is given, the volume is attenuated and panned
+            according to the listener position
+        """
+        if volume is None:
+            volume = self.volume
         if is_low_volume:
-            self.lowSoundEffect.play_once()
-        else:
-            if volume is not None:
-                #old_volume = self.volume()
-                if volume < 0.005:
-                    return
-                self.setVolume(volume)
-            self.play()
+            volume /= 8
+        pan = 0.0
+        listener_position = sound_manager.listener_position
+        if position is not None and listener_position is not None:
+            dx = position[0] - listener_position[0]
+            dy = position[1] - listener_position[1]
+            squared_distance = dx*dx + dy*dy
+            if squared_distance > AUDIBLE_RADIUS * AUDIBLE_RADIUS:
+                return
+            volume *= REFERENCE_DISTANCE * REFERENCE_DISTANCE / (REFERENCE_DISTANCE * REFERENCE_DISTANCE
+                                                                 + squared_distance)
+            pan = max(-1.0, min(1.0, dx / PAN_DISTANCE))
+        if volume < AUDIBILITY_THRESHOLD or volume <= self.requested_volume:
+            return
+        if self.requested_volume == 0.0:
+            sound_manager.requested_sound_effects.append(self)
+        self.requested_volume = min(volume, 1.0)
+        self.requested_pan = pan
 
     def play_long(self, duration_in_ms=50):
-        if self.timer is None or not self.isPlaying():
-            if self.isMuted():
-                self.setMuted(False)
+        """ plays the sound effect, or keeps it playing, until duration_in_ms without new call
+        """
+        self.long_end_time = perf_counter() + duration_in_ms / 1e3
+        if self.long_voice is None and not self.is_long_requested:
+            self.is_long_requested = True
             self.play_once()
-            self.timer = QTimer()
-            self.timer.setSingleShot(True)
-            self.timer.timeout.connect(self._stop)
-        else:
-            self.timer.stop()
-        self.timer.start(duration_in_ms)
 
-    def _stop(self):
-        self.timer = None
-        self.setMuted(True)
+    def free_voice(self):
+        """ returns a voice to play the sound effect, which shall be decoded: an idle one, a new one or the least
+            recently started one
+        """
+        for voice in self.voices:
+            if voice is not self.long_voice and not voice.is_playing():
+                return voice
+        if len(self.voices) < VOICES_PER_EFFECT:
+            voice = MixerVoice(self.samples)
+            self.voices.append(voice)
+            return voice
+        voice = self.voices[self.next_voice_idx]
+        if voice is self.long_voice:
+            self.next_voice_idx = (self.next_voice_idx + 1) % len(self.voices)
+            voice = self.voices[self.next_voice_idx]
+        self.next_voice_idx = (self.next_voice_idx + 1) % len(self.voices)
+        return voice
+
+
+class SoundManager:
+    """ plays on the mixer, at the end of each frame, the sound effects requested during the frame: only the
+        loudest request of each sound effect is kept, then the requests are played by decreasing priority and
+        volume, within MAX_VOICES voices; a request may take the voice of a playing sound effect of lower priority;
+        the requests of a sound effect not decoded yet are kept until it is (e.g. the sound effects played at
+        startup), except the long ones
+    """
+
+    __slots__ = ("mixer", "listener_position", "requested_sound_effects", "long_sound_effects", "active_voices")
+
+    def __init__(self, mixer):
+        self.mixer = mixer
+        # position of the listener, in space coordinates; None for no spatialization
+        self.listener_position = None
+        self.requested_sound_effects = []
+        self.long_sound_effects = []
+        # (priority, voice) of the voices started, possibly finished since
+        self.active_voices = []
+
+    def flush(self):
+        if self.long_sound_effects:
+            self.stop_long_sound_effects()
+        requested_sound_effects = self.requested_sound_effects
+        if not requested_sound_effects:
+            return
+        mixer = self.mixer
+        self.active_voices = [(priority, voice) for (priority, voice) in self.active_voices if voice.is_playing()]
+        active_voices = self.active_voices
+        # the requests of the sound effects not decoded yet by the loader thread are kept for the next frames,
+        # except the long ones; the samples are checked once, since the loader thread may publish them meanwhile
+        sound_effects = []
+        pending_sound_effects = []
+        for sound_effect in requested_sound_effects:
+            if sound_effect.samples is None and not sound_effect.is_long_requested:
+                pending_sound_effects.append(sound_effect)
+            else:
+                sound_effects.append(sound_effect)
+        sound_effects.sort(key=lambda s: (s.priority, s.requested_volume), reverse=True)
+        for sound_effect in sound_effects:
+            if sound_effect.samples is None:
+                # long request of a sound effect not decoded yet
+                continue
+            if len(active_voices) >= MAX_VOICES:
+                (lowest_priority, lowest_idx) = min((priority, idx)
+                                                    for (idx, (priority, _)) in enumerate(active_voices))
+                if lowest_priority >= sound_effect.priority:
+                    # the remaining requests have lower or equal priorities
+                    break
+                mixer.stop(active_voices.pop(lowest_idx)[1])
+            voice = sound_effect.free_voice()
+            mixer.play(voice, sound_effect.requested_volume, sound_effect.requested_pan)
+            active_voices.append((sound_effect.priority, voice))
+            if sound_effect.is_long_requested:
+                sound_effect.long_voice = voice
+                self.long_sound_effects.append(sound_effect)
+        for sound_effect in sound_effects:
+            sound_effect.requested_volume = 0.0
+            sound_effect.is_long_requested = False
+        self.requested_sound_effects = pending_sound_effects
+
+    def stop_long_sound_effects(self):
+        """ stops the long sound effects whose duration is elapsed; forgets those that ended by themselves
+        """
+        time = perf_counter()
+        remaining_long_sound_effects = []
+        for sound_effect in self.long_sound_effects:
+            long_voice = sound_effect.long_voice
+            if time > sound_effect.long_end_time:
+                self.mixer.stop(long_voice)
+            elif long_voice.is_playing():
+                remaining_long_sound_effects.append(sound_effect)
+                continue
+            sound_effect.long_voice = None
+        self.long_sound_effects = remaining_long_sound_effects
+
+
+class SilentSoundEffect:
+    """ stand-in for SoundEffect, used when no sound shall be played (e.g. headless simulation)
+    """
+
+    def __init__(self, name, volume=1, priority=0):
+        pass
+
+    def play_once(self, volume=None, is_low_volume=False, position=None):
+        pass
+
+    def play_long(self, duration_in_ms=50):
+        pass
 
 
 class Sound:
 
-    tts = QTextToSpeech()
-    tts.setVoice(tts.availableVoices()[0])
+    # the text-to-speech engine is created at first use, since it requires a QApplication
+    tts = None
+    is_silent = False
+    mixer = None
+    # sound effects not decoded yet, see load_in_background
+    lazy_sound_effects = []
+    loader_thread = None
 
     @staticmethod
     def say(message):
+        if Sound.is_silent:
+            return
+        from PyQt5.QtTextToSpeech import QTextToSpeech
+        if Sound.tts is None:
+            Sound.tts = QTextToSpeech()
+            Sound.tts.setVoice(Sound.tts.availableVoices()[0])
         if Sound.tts.state() == QTextToSpeech.Ready:
             Sound.tts.say(message)
 
     @staticmethod
-    def sound_effect(name,volume=None):
-        se = QSoundEffect()
-        se.setSource(QUrl.fromLocalFile(name+'.wav'))
-        if volume is not None:
-            se.setVolume(volume)
-        return se
-
-    @staticmethod
-    def init():
-        Sound.explosion1 = SoundEffect('explosion1')
-        Sound.explosion2 = SoundEffect('435413__v-ktor__explosion12')
-        Sound.hit1 = SoundEffect('hit1', 0.1)
-        Sound.hit2 = SoundEffect('hit2', 0.1)
-        Sound.hit3 = SoundEffect('hit3', 0.1)
+    def init(silent=False, with_output=True):
+        """ declares the sound effects, which are actually decoded by load_in_background;
+            if with_output is False, the mix is not played but can be got by Sound.mixer.render
+        """
+        global sound_manager
+        Sound.is_silent = silent
+        if Sound.mixer is not None:
+            Sound.mixer.stop_output()
+        Sound.mixer = Mixer()
+        if not silent and with_output:
+            Sound.mixer.start_output()
+        sound_manager = SoundManager(Sound.mixer)
+        sound_effect_class = SilentSoundEffect if silent else SoundEffect
+        Sound.explosion1 = sound_effect_class('explosion1', priority=2)
+        Sound.explosion2 = sound_effect_class('435413__v-ktor__explosion12', priority=2)
+        Sound.hit1 = sound_effect_class('hit1', 0.1)
+        Sound.hit2 = sound_effect_class('hit2', 0.1)
+        Sound.hit3 = sound_effect_class('hit3', 0.1)
         #Sound.start1 = SoundEffect('start1')
-        Sound.thrust1 = SoundEffect('thrust1', 0.05)
+        Sound.thrust1 = sound_effect_class('thrust1', 0.05, priority=1)
         #Sound.thrust2 = SoundEffect('thrust2', 0.05)
         #Sound.thrust3 = SoundEffect('thrust3', 0.05)
-        Sound.thrust4 = SoundEffect('824193__chungus43a__emd-567-engine-notch-4-synth-recreation', 0.05)
-        Sound.thrust5 = SoundEffect('222804__gthall__engine-idle', 0.20)
-        Sound.shoot1 = SoundEffect('shoot1', 0.15)
-        Sound.shoot2 = SoundEffect('shoot2', 0.15)
-        Sound.shoot3 = SoundEffect('shoot3', 0.15)
-        Sound.water1 = SoundEffect('water1', 0.5)
-        Sound.water2 = SoundEffect('water2', 0.2)
-        Sound.water3 = SoundEffect('water3')
+        Sound.thrust4 = sound_effect_class('824193__chungus43a__emd-567-engine-notch-4-synth-recreation', 0.05,
+                                           priority=1)
+        Sound.thrust5 = sound_effect_class('222804__gthall__engine-idle', 0.20, priority=1)
+        Sound.shoot1 = sound_effect_class('shoot1', 0.15, priority=1)
+        Sound.shoot2 = sound_effect_class('shoot2', 0.15, priority=1)
+        Sound.shoot3 = sound_effect_class('shoot3', 0.15, priority=1)
+        Sound.water1 = sound_effect_class('water1', 0.5)
+        Sound.water2 = sound_effect_class('water2', 0.2)
+        Sound.water3 = sound_effect_class('water3')
         # Sound.water1b = SoundEffect('water1', 0.1)
         # Sound.water3b = SoundEffect('water3', 0.04)
-        Sound.change_scene = SoundEffect('change_scene', 0.25)
+        Sound.change_scene = sound_effect_class('change_scene', 0.25, priority=3)
         Sound.change_scene.play_once()
+        if not silent:
+            Sound.lazy_sound_effects = [s for s in Sound.__dict__.values() if isinstance(s, SoundEffect)]
         '''
         for s in Sound.__dict__.values():
             if isinstance(s,QSound):
@@ -95,6 +437,30 @@ class Sound:
                 s.stop()
         '''
 
+    @staticmethod
+    def set_listener(position):
+        """ sets the position of the listener, for positioned sound effects; None for no spatialization
+        """
+        sound_manager.listener_position = position
+
+    @staticmethod
+    def flush():
+        """ plays the sound effects requested since the previous call; to be called once per frame
+        """
+        sound_manager.flush()
+
+    @staticmethod
+    def load_in_background():
+        """ decodes the sound effects in a worker thread, so that the frames are not delayed; to be called once the
+            first frame is displayed; the sound effects requested before their decoding are played once decoded
+        """
+        if Sound.lazy_sound_effects:
+            Sound.loader_thread = SoundLoaderThread(Sound.lazy_sound_effects)
+            Sound.lazy_sound_effects = []
+            Sound.loader_thread.start()
+
+sound_manager = SoundManager(Mixer())
+
 #Sound.init()
 #
 # def sound_thread_function():